@@ -1,11 +1,18 @@
+import time
+_startup = time.perf_counter()
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
+from datetime import date
 import yaml
-from understatapi import UnderstatClient
-from scripts.data_load import run_data_load
-from scripts.data_align import prep_trainset
-from scripts.feature_engineering import engineer_features
-from scripts.baseline_model import train_model
-from scripts.simulate_returns import simulate_bets
-from scripts.predict import predict_gw
+from scripts import profiling
+from scripts.stage_cache import record_stage, stage_fingerprint, stage_is_fresh
+from scripts.storage import stage_path
+
+STARTUP_IMPORT_SECONDS = time.perf_counter() - _startup
 
 ### MANUAL CONFIGURATION BEFORE RUNNING SCRIPT ###
 # - Check if last weeks data is available via API
@@ -14,63 +21,803 @@ from scripts.predict import predict_gw
 # - Set the season and gameweek to predict in config.yaml
 # - Ensure all paths in config.yaml are correct
 
+# Heavy dependencies (understatapi, xgboost, sklearn, matplotlib, requests)
+# are imported inside the stage that needs them, so e.g. `predict` does not
+# pay for ingest or plotting imports.
+
 def load_config(config_path="config.yaml"):
     with open(config_path, "r") as f:
         return yaml.safe_load(f)
 
-def main():
-    config = load_config()
-    
-    start_year = config['start_year']
-    end_year = config['end_year']
-    league = config['league']
+@contextmanager
+def import_timer(stage):
+    start = time.perf_counter()
+    yield
+    print(f"⏱️  {stage} imports: {time.perf_counter() - start:.2f}s")
+
+def resolve_paths(config):
+    """Config values with every stage path resolved for the chosen storage format."""
+    storage_format = config.get('storage_format', 'csv')
+    cfg = dict(config)
+    cfg['storage_format'] = storage_format
+    for key in ['raw_match_data_path', 'raw_elo_data_path', 'raw_team_matches_path',
+                'merged_trainset_path', 'final_trainset_path', 'feature_store_path']:
+        if cfg.get(key):
+            cfg[key] = stage_path(cfg[key], storage_format)
+
+    cfg['output_predictions_template'] = config["output_predictions_path"]
+    cfg['output_predictions_path'] = config["output_predictions_path"].format(
+        season_to_predict=config['season_to_predict'],
+        gw_to_predict=config['gw_to_predict']
+    )
+    cfg['results_path'] = os.path.join(os.path.dirname(config['model_path']), 'results.csv')
+    cfg['sim_output_dir'] = config.get('sim_output_dir', "data/output/train_eval")
+    return cfg
+
+# ---------- STAGES ----------
+# Each stage has: inputs (for the stage hash), outputs, run, load and the
+# upstream (stage, key) results it requires. run and load put the stage's
+# results into `state`; required results not in `state` are loaded from disk
+# before the stage runs, so any stage can run on its own.
+
+def _require(stage, cfg, state, key):
+    if key not in state:
+        STAGES[stage]['load'](cfg, state)
+    return state[key]
+
+def ingest_inputs(cfg):
+    return dict(
+        config_values={k: cfg.get(k) for k in [
+            'start_year', 'end_year', 'league', 'offline_ingest', 'understat_store_dir', 'understat_close_after_days',
+            'elo_cache_dir', 'elo_timeline_path', 'storage_format',
+        ]},
+        code_files=['scripts/data_load.py', 'scripts/elo_timeline.py', 'scripts/storage.py'],
+        # APIs can change at any time; treat fetched data as fresh for the day
+        extra=date.today().isoformat(),
+    )
+
+def elo_path(cfg):
+    """The Elo timeline when one is configured, else the ClubElo table."""
+    return cfg.get('elo_timeline_path') or cfg['raw_elo_data_path']
+
+def elo_input_path(cfg):
+    """The Elo file align reads: the timeline once it exists, else the ClubElo table it is seeded from."""
+    path = cfg.get('elo_timeline_path')
+    return path if path and os.path.exists(path) else cfg['raw_elo_data_path']
+
+def ingest_outputs(cfg):
+    return [path for path in [cfg['raw_match_data_path'], elo_path(cfg), cfg.get('raw_team_matches_path')] if path]
+
+def run_ingest(cfg, state):
+    with import_timer('ingest'):
+        from understatapi import UnderstatClient
+        from scripts.data_load import run_data_load
+
+    state['matches'], state['elo'] = run_data_load(
+        UnderstatClient(), cfg['start_year'], cfg['end_year'], cfg['league'],
+        cfg['raw_match_data_path'], cfg['raw_elo_data_path'],
+        elo_cache_dir=cfg.get('elo_cache_dir'), elo_max_workers=cfg.get('elo_max_workers', 8),
+        understat_store_dir=cfg.get('understat_store_dir'), offline=cfg.get('offline_ingest', False),
+        raw_team_matches_path=cfg.get('raw_team_matches_path'), elo_timeline_path=cfg.get('elo_timeline_path'),
+        close_after_days=cfg.get('understat_close_after_days'),
+    )
+    print(state['matches'].tail())
+
+def load_ingest(cfg, state):
+    from scripts.storage import SCHEMAS, read_table
+    state['matches'] = read_table(cfg['raw_match_data_path'], SCHEMAS['matches'])
+    if cfg.get('elo_timeline_path'):
+        from scripts.elo_timeline import EloTimeline
+        if os.path.exists(cfg['elo_timeline_path']):
+            state['elo'] = EloTimeline.load(cfg['elo_timeline_path'])
+        else:
+            # No ingest since the timeline was configured: seed it from the ClubElo table
+            state['elo'] = EloTimeline.from_intervals(read_table(cfg['raw_elo_data_path'], SCHEMAS['elo']))
+            state['elo'].save(cfg['elo_timeline_path'])
+            print(f"Seeded Elo timeline {cfg['elo_timeline_path']} from {cfg['raw_elo_data_path']}")
+    else:
+        state['elo'] = read_table(cfg['raw_elo_data_path'], SCHEMAS['elo'])
+
+def align_inputs(cfg):
+    return dict(
+        input_files=[cfg['raw_match_data_path'], elo_input_path(cfg), cfg['raw_squad_data_path'], cfg['raw_fixtures_path']],
+        config_values={k: cfg[k] for k in ['gw_to_predict', 'season_to_predict']},
+        code_files=['scripts/data_align.py', 'scripts/elo_timeline.py', 'scripts/odds.py', 'scripts/storage.py'],
+    )
+
+def run_align(cfg, state):
+    with import_timer('align'):
+        from scripts.data_align import prep_trainset
+
+    state['merged'] = prep_trainset(
+        _require('ingest', cfg, state, 'matches'), _require('ingest', cfg, state, 'elo'),
+        cfg['raw_squad_data_path'], cfg['raw_fixtures_path'], cfg['merged_trainset_path'],
+        cfg['gw_to_predict'], cfg['season_to_predict']
+    )
+
+def load_align(cfg, state):
+    from scripts.storage import SCHEMAS, read_table
+    state['merged'] = read_table(cfg['merged_trainset_path'], SCHEMAS['trainset'])
+
+def features_inputs(cfg):
+    return dict(
+        input_files=[cfg['merged_trainset_path']],
+        config_values={k: cfg.get(k) for k in ['feature_store_path', 'verify_feature_store']},
+        code_files=['scripts/feature_engineering.py', 'scripts/feature_store.py', 'scripts/storage.py'],
+    )
+
+def run_features(cfg, state):
+    merged_trainset = _require('align', cfg, state, 'merged')
+    if cfg.get('feature_store_path'):
+        with import_timer('features'):
+            from scripts.feature_store import engineer_features_incremental
+        state['final'] = engineer_features_incremental(
+            merged_trainset, cfg['final_trainset_path'], cfg['feature_store_path'], cfg.get('verify_feature_store', False)
+        )
+    else:
+        with import_timer('features'):
+            from scripts.feature_engineering import engineer_features
+        state['final'] = engineer_features(merged_trainset, cfg['final_trainset_path'])
+
+def load_features(cfg, state):
+    from scripts.storage import SCHEMAS, read_table
+    state['final'] = read_table(cfg['final_trainset_path'], SCHEMAS['trainset'])
+
+def train_inputs(cfg):
+    from scripts.training_config import latest_training_config_path
+    training_config_path = latest_training_config_path(cfg.get('training_config_dir'))
+    return dict(
+        input_files=[cfg['final_trainset_path'], *([training_config_path] if training_config_path else [])],
+        config_values={k: cfg.get(k) for k in [
+            'gw_to_predict', 'season_to_predict', 'model_registry_dir', 'warm_start', 'warm_start_rounds',
+            'full_refit_every', 'decay_half_life_days', 'compare_full_refit',
+        ]},
+        code_files=['scripts/baseline_model.py', 'scripts/model_registry.py', 'scripts/training_config.py'],
+    )
 
-    raw_match_data_path = config['raw_match_data_path']
-    raw_elo_data_path = config['raw_elo_data_path']
-    raw_fixtures_path = config['raw_fixtures_path']
-    raw_squad_data_path = config['raw_squad_data_path']
-    merged_trainset_path = config['merged_trainset_path']
-    final_trainset_path = config['final_trainset_path']
-    features_path = config['features_path']
-    label_encoder_path = config['label_encoder_path']
-    model_path = config['model_path']
+def train_outputs(cfg):
+    return [cfg['model_path'], cfg['label_encoder_path'], cfg['features_path'], cfg['results_path']]
 
-    gw_to_predict = config['gw_to_predict']
-    season_to_predict = config['season_to_predict']
-    threshold = config['threshold_ev']
+def run_train(cfg, state):
+    with import_timer('train'):
+        from scripts.baseline_model import train_model
+        from scripts.training_config import load_training_config
 
-    output_path_template = config["output_predictions_path"]
-    output_predictions_path = output_path_template.format(
-        season_to_predict=season_to_predict,
-        gw_to_predict=gw_to_predict
+    state['model'], state['le'], state['feature_cols'], state['results'] = train_model(
+        _require('features', cfg, state, 'final'), cfg['gw_to_predict'], cfg['season_to_predict'],
+        cfg['features_path'], cfg['label_encoder_path'], cfg['model_path'], cfg.get('model_registry_dir'),
+        warm_start=cfg.get('warm_start', False), warm_start_rounds=cfg.get('warm_start_rounds', 10),
+        full_refit_every=cfg.get('full_refit_every', 4), decay_half_life_days=cfg.get('decay_half_life_days'),
+        compare_full_refit=cfg.get('compare_full_refit', False),
+        training_config=load_training_config(cfg.get('training_config_dir')),
+        output_dir=cfg['sim_output_dir'], n_jobs=cfg.get('n_jobs')
     )
-    print(f"Output predictions path: {output_predictions_path}")
 
-    client = UnderstatClient()
+def load_train(cfg, state):
+    with import_timer('model load'):
+        import joblib
+        import pandas as pd
+
+    with open(cfg['features_path'], 'r') as f:
+        state['feature_cols'] = json.load(f)
+    state['model'] = joblib.load(cfg['model_path'])
+    state['le'] = joblib.load(cfg['label_encoder_path'])
+    state['results'] = pd.read_csv(cfg['results_path'])
+
+def simulate_outputs(cfg):
+    return [os.path.join(cfg['sim_output_dir'], name) for name in ['last_gw_sim_details.csv', 'last_gw_sim_summary.csv']]
+
+def run_simulate(cfg, state):
+    with import_timer('simulate'):
+        from scripts.simulate_returns import simulate_bets
 
-    matches_df, elo_df = run_data_load(
-        client, start_year, end_year, league, raw_match_data_path, raw_elo_data_path
+    simulate_bets(_require('train', cfg, state, 'results'), cfg['sim_output_dir'])
+
+def predict_inputs(cfg):
+    return dict(
+        input_files=[
+            cfg['final_trainset_path'], cfg['model_path'], cfg['label_encoder_path'], cfg['features_path'],
+            *([cfg['raw_odds_path']] if cfg.get('raw_odds_path') else []),
+        ],
+        config_values={k: cfg.get(k) for k in ['gw_to_predict', 'season_to_predict', 'threshold_ev', 'storage_format', 'odds_format']},
+        code_files=['scripts/predict.py', 'scripts/odds.py', 'scripts/storage.py'],
     )
-    print(matches_df.tail())
 
-    merged_trainset = prep_trainset(
-        matches_df, elo_df, raw_squad_data_path, raw_fixtures_path, merged_trainset_path, gw_to_predict, season_to_predict
+def run_predict(cfg, state):
+    with import_timer('predict'):
+        from scripts.predict import predict_gw
+
+    state['predictions'] = predict_gw(
+        cfg['gw_to_predict'], cfg['season_to_predict'], cfg['threshold_ev'],
+        _require('train', cfg, state, 'model'), _require('train', cfg, state, 'le'),
+        _require('train', cfg, state, 'feature_cols'),
+        cfg['final_trainset_path'], cfg['output_predictions_path'], cfg['storage_format'],
+        odds_path=cfg.get('raw_odds_path'), odds_format=cfg.get('odds_format', 'auto')
     )
+    print(state['predictions'])
+
+def load_predict(cfg, state):
+    import pandas as pd
+    state['predictions'] = pd.read_csv(cfg['output_predictions_path'])
 
-    final_trainset = engineer_features(
-        merged_trainset, final_trainset_path
+def history_paths(cfg):
+    """
+    Every weekly export matching output_predictions_path, oldest gameweek
+    first, so earlier weeks are backfilled into the history in a fixed order.
+    Other files in the folder (first-run or combined exports) are left out.
+    """
+    import glob
+    import re
+    template = cfg['output_predictions_template']
+    fields = {'season_to_predict': r'(?P<season>\d+)', 'gw_to_predict': r'(?P<gw>\d+)'}
+    pattern = re.compile(re.escape(template).replace(r'\{', '{').replace(r'\}', '}').format(**fields) + '$')
+    matched = []
+    for path in glob.glob(template.format(season_to_predict='*', gw_to_predict='*')):
+        match = pattern.match(path)
+        if match:
+            matched.append((int(match['season']), int(match['gw']), path))
+    return [path for _, _, path in sorted(matched)]
+
+def history_inputs(cfg):
+    return dict(
+        input_files=[cfg['raw_match_data_path'], *history_paths(cfg)],
+        config_values={k: cfg.get(k) for k in ['history_store_dir', 'storage_format']},
+        code_files=['scripts/prediction_history.py', 'scripts/storage.py'],
     )
 
-    model, le, feature_cols, results_df = train_model(
-        final_trainset, gw_to_predict, season_to_predict, features_path, label_encoder_path, model_path
+def history_outputs(cfg):
+    return [stage_path(os.path.join(cfg['history_store_dir'], '_partitions'), cfg['storage_format'])]
+
+def run_history(cfg, state):
+    with import_timer('history'):
+        from scripts.prediction_history import update_history
+
+    os.makedirs(cfg['history_store_dir'], exist_ok=True)
+    state['history_recorded'], state['history_settled'] = update_history(
+        cfg['history_store_dir'], history_paths(cfg), _require('ingest', cfg, state, 'matches'), cfg['storage_format']
     )
 
-    simulate_bets(results_df)
+def dashboard_inputs(cfg):
+    return dict(
+        input_files=[
+            cfg['output_predictions_path'], cfg['model_path'], *history_outputs(cfg),
+            *[os.path.join(cfg['sim_output_dir'], name) for name in ['last_gw_sim_summary.csv', 'last_gw_sim_details.csv', 'train_acc.csv']],
+        ],
+        code_files=['scripts/dashboard.py', 'scripts/prediction_history.py'],
+    )
+
+def run_dashboard(cfg, state):
+    with import_timer('dashboard'):
+        from scripts.dashboard import build_dashboard_bundle
+
+    state['dashboard_version'] = build_dashboard_bundle(
+        cfg['dashboard_bundle_path'], cfg['output_predictions_path'], cfg['sim_output_dir'],
+        model=_require('train', cfg, state, 'model'), history_store_dir=cfg.get('history_store_dir'),
+        storage_format=cfg['storage_format'],
+    )
+
+def backtest_inputs(cfg):
+    from scripts.training_config import latest_training_config_path
+    training_config_path = latest_training_config_path(cfg.get('training_config_dir'))
+    return dict(
+        input_files=[cfg['final_trainset_path'], *([training_config_path] if training_config_path else [])],
+        config_values={k: cfg.get(k) for k in [
+            'threshold_ev', 'backtest_seasons', 'backtest_max_workers', 'backtest_threads_per_fold',
+            'backtest_predictions_path',
+        ]},
+        code_files=[
+            'scripts/backtest.py', 'scripts/baseline_model.py', 'scripts/shared_arrays.py', 'scripts/training_config.py',
+        ],
+    )
 
-    predictions = predict_gw(
-        gw_to_predict, season_to_predict, threshold, model, le, feature_cols, final_trainset_path, output_predictions_path
+def backtest_outputs(cfg):
+    return [path for path in [cfg['backtest_output_path'], cfg.get('backtest_predictions_path')] if path]
+
+def run_backtest_stage(cfg, state):
+    with import_timer('backtest'):
+        from scripts.backtest import run_backtest
+        from scripts.training_config import load_training_config
+
+    state['backtest'] = run_backtest(
+        _require('features', cfg, state, 'final'),
+        cfg['backtest_output_path'],
+        seasons=cfg.get('backtest_seasons'),
+        max_workers=cfg.get('backtest_max_workers'),
+        threads_per_fold=cfg.get('backtest_threads_per_fold', 1),
+        threshold=cfg['threshold_ev'],
+        predictions_output_path=cfg.get('backtest_predictions_path'),
+        training_config=load_training_config(cfg.get('training_config_dir')),
+    )
+
+def tune_inputs(cfg):
+    return dict(
+        input_files=[cfg['final_trainset_path']],
+        config_values={k: cfg.get(k) for k in [
+            'tune_trials', 'tune_cv_seasons', 'tune_early_stopping_rounds', 'tune_max_workers', 'tune_threads_per_trial',
+        ]},
+        code_files=['scripts/tune.py', 'scripts/backtest.py', 'scripts/shared_arrays.py'],
     )
-    print(predictions)
+
+def run_tune_stage(cfg, state):
+    with import_timer('tune'):
+        from scripts.tune import run_tuning
+
+    state['tune_trials'], state['training_config_path'] = run_tuning(
+        _require('features', cfg, state, 'final'),
+        cfg['training_config_dir'],
+        cfg['tune_trials_output_path'],
+        n_trials=cfg.get('tune_trials', 40),
+        n_seasons=cfg.get('tune_cv_seasons', 3),
+        early_stopping_rounds=cfg.get('tune_early_stopping_rounds', 30),
+        max_workers=cfg.get('tune_max_workers'),
+        threads_per_trial=cfg.get('tune_threads_per_trial', 1),
+    )
+
+SWEEP_KEYS = [
+    'strategy_sweep_thresholds', 'strategy_sweep_outcomes', 'strategy_sweep_odds_bands', 'strategy_sweep_staking',
+    'strategy_sweep_min_bets', 'strategy_sweep_kelly_fraction',
+]
+
+def sweep_inputs(cfg):
+    return dict(
+        input_files=[cfg['backtest_predictions_path']],
+        config_values={k: cfg.get(k) for k in SWEEP_KEYS},
+        code_files=['scripts/strategy_sweep.py'],
+    )
+
+def run_sweep_stage(cfg, state):
+    with import_timer('sweep'):
+        import pandas as pd
+        from scripts.strategy_sweep import run_strategy_sweep
+
+    if not os.path.exists(cfg['backtest_predictions_path']):
+        raise SystemExit(f"No backtest predictions at {cfg['backtest_predictions_path']}: run the backtest stage first")
+    # A null grid setting keeps strategy_grid's default
+    state['sweep'] = run_strategy_sweep(
+        pd.read_csv(cfg['backtest_predictions_path']),
+        cfg['strategy_sweep_output_path'],
+        min_bets=cfg.get('strategy_sweep_min_bets') or 50,
+        kelly_fraction=cfg.get('strategy_sweep_kelly_fraction') or 0.25,
+        thresholds=cfg.get('strategy_sweep_thresholds'),
+        outcome_filters=cfg.get('strategy_sweep_outcomes'),
+        odds_bands=[tuple(band) for band in cfg['strategy_sweep_odds_bands']] if cfg.get('strategy_sweep_odds_bands') else None,
+        staking_rules=cfg.get('strategy_sweep_staking'),
+    )
+
+def bankroll_inputs(cfg):
+    return dict(
+        input_files=[*history_outputs(cfg), *history_paths(cfg)],
+        config_values={k: cfg.get(k) for k in [
+            'threshold_ev', 'season_to_predict', 'bankroll_season', 'bankroll_paths', 'bankroll_initial',
+            'bankroll_stake', 'bankroll_fraction', 'bankroll_kelly_fraction', 'bankroll_ruin_fraction',
+            'bankroll_outcome_model', 'bankroll_seed',
+        ]},
+        code_files=['scripts/simulate_returns.py', 'scripts/prediction_history.py'],
+    )
+
+def run_bankroll_stage(cfg, state):
+    with import_timer('bankroll'):
+        from scripts.simulate_returns import load_predictions, run_bankroll_simulation
+
+    # Every recorded gameweek of the season, from the history store when there is one
+    season = cfg.get('bankroll_season') or cfg['season_to_predict']
+    if cfg.get('history_store_dir'):
+        from scripts.prediction_history import query_history
+        predictions = query_history(cfg['history_store_dir'], season=season, storage_format=cfg['storage_format'])
+    else:
+        predictions = load_predictions(os.path.dirname(cfg['output_predictions_path']), season)
+    if predictions.empty:
+        raise SystemExit(f"No recorded predictions for {season}: run the pipeline's history stage first")
+
+    state['bankroll'] = run_bankroll_simulation(
+        predictions, cfg['sim_output_dir'],
+        n_paths=cfg.get('bankroll_paths', 10000),
+        initial_bankroll=cfg.get('bankroll_initial', 100.0),
+        stake=cfg.get('bankroll_stake', 1.0),
+        fraction=cfg.get('bankroll_fraction', 0.02),
+        kelly_fraction=cfg.get('bankroll_kelly_fraction', 0.25),
+        ruin_fraction=cfg.get('bankroll_ruin_fraction', 0.1),
+        outcome_model=cfg.get('bankroll_outcome_model', 'bookmaker'),
+        threshold=cfg['threshold_ev'],
+        seed=cfg.get('bankroll_seed', 42),
+    )
+
+STAGES = {
+    'ingest': dict(inputs=ingest_inputs, outputs=ingest_outputs, run=run_ingest, load=load_ingest, requires=[]),
+    'align': dict(
+        inputs=align_inputs, outputs=lambda cfg: [cfg['merged_trainset_path']], run=run_align, load=load_align,
+        requires=[('ingest', 'matches'), ('ingest', 'elo')],
+    ),
+    'features': dict(
+        inputs=features_inputs, outputs=lambda cfg: [cfg['final_trainset_path']], run=run_features,
+        load=load_features, requires=[('align', 'merged')],
+    ),
+    'train': dict(inputs=train_inputs, outputs=train_outputs, run=run_train, load=load_train, requires=[('features', 'final')]),
+    'simulate': dict(
+        inputs=lambda cfg: dict(input_files=[cfg['results_path']], code_files=['scripts/simulate_returns.py']),
+        outputs=simulate_outputs, run=run_simulate, load=lambda cfg, state: None, requires=[('train', 'results')],
+    ),
+    'predict': dict(
+        inputs=predict_inputs, outputs=lambda cfg: [cfg['output_predictions_path']], run=run_predict,
+        load=load_predict, requires=[('train', 'model'), ('train', 'le'), ('train', 'feature_cols')],
+    ),
+    'history': dict(
+        inputs=history_inputs, outputs=history_outputs, run=run_history, load=lambda cfg, state: None,
+        requires=[('ingest', 'matches')],
+    ),
+    'dashboard': dict(
+        inputs=dashboard_inputs, outputs=lambda cfg: [cfg['dashboard_bundle_path']], run=run_dashboard,
+        load=lambda cfg, state: None, requires=[('train', 'model')],
+    ),
+    'backtest': dict(
+        inputs=backtest_inputs, outputs=backtest_outputs, run=run_backtest_stage, load=lambda cfg, state: None,
+        requires=[('features', 'final')],
+    ),
+    'sweep': dict(
+        inputs=sweep_inputs, outputs=lambda cfg: [cfg['strategy_sweep_output_path']], run=run_sweep_stage,
+        load=lambda cfg, state: None, requires=[],
+    ),
+    'bankroll': dict(
+        inputs=bankroll_inputs, outputs=lambda cfg: [os.path.join(cfg['sim_output_dir'], 'bankroll_sim_summary.csv')],
+        run=run_bankroll_stage, load=lambda cfg, state: None, requires=[],
+    ),
+    'tune': dict(
+        inputs=tune_inputs, outputs=lambda cfg: [cfg['tune_trials_output_path']], run=run_tune_stage,
+        load=lambda cfg, state: None, requires=[('features', 'final')],
+    ),
+}
+
+# Stages of a full weekly run, in order; backtest and tune only run on request
+PIPELINE = ['ingest', 'align', 'features', 'train', 'simulate', 'predict', 'history', 'dashboard']
+
+class StageRunner:
+    """
+    Runs pipeline stages, skipping those whose declared inputs hash the same as last time.
+
+    Each stage declares its input files, config values and code files. The
+    hash is stored next to the stage's outputs, and a skipped stage hands
+    back its cached outputs instead.
+    """
+
+    def __init__(self, cfg, force=(), dry_run=False, profile_dir=None):
+        self.cfg = cfg
+        self.profile_dir = profile_dir
+        self.state = {}
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.upstream_will_run = False
+
+    def run(self, name):
+        stage = STAGES[name]
+        outputs = stage['outputs'](self.cfg)
+        fingerprint = stage_fingerprint(**stage['inputs'](self.cfg))
+        forced = name in self.force or 'all' in self.force
+        fresh = not forced and stage_is_fresh(name, fingerprint, outputs)
+
+        if self.dry_run:
+            if forced:
+                reason = "run (forced)"
+            elif not fresh:
+                reason = "run (inputs changed)"
+            elif self.upstream_will_run:
+                reason = "run if upstream outputs change"
+            else:
+                reason = "skip (cached)"
+            print(f"[dry-run] {name}: {reason}")
+            self.upstream_will_run = self.upstream_will_run or not fresh
+            return
+
+        if fresh:
+            print(f"⏭️  Skipping {name}: inputs unchanged, cached outputs are loaded when needed")
+            profiling.record_skipped(name)
+            return
+
+        print(f"▶️  Running {name}")
+        profile_path = os.path.join(self.profile_dir, f"{name}.prof") if self.profile_dir else None
+        with profiling.measure(name, profile_path=profile_path) as record:
+            # Rows in: the upstream results, loaded first so they are not counted as output
+            for upstream, key in stage['requires']:
+                profiling.note_rows_in(profiling.count_rows(_require(upstream, self.cfg, self.state, key)))
+            before = {key: id(value) for key, value in self.state.items()}
+            stage['run'](self.cfg, self.state)
+            # Rows out: every table the stage added to or replaced in the state
+            for key, value in self.state.items():
+                if before.get(key) != id(value):
+                    profiling.note_rows_out(profiling.count_rows(value))
+        print(f"⏱️  {name}: {record['wall_s']:.2f}s wall, {record['cpu_s']:.2f}s CPU, "
+              f"process peak RSS {record['process_peak_rss_mb']:.0f}MB (+{record['rss_growth_mb']:.0f}MB)")
+        record_stage(name, fingerprint, outputs)
+
+def main(force=(), dry_run=False, stages=PIPELINE, config_path="config.yaml", profile=False, config=None, run_id=None):
+    """
+    Runs stages in order and writes a run log of each stage's timings and its
+    hot functions to run_log_dir. With profile, each stage also gets a cProfile dump.
+    config, if given, is used instead of reading config_path.
+    """
+    cfg = resolve_paths(config if config is not None else load_config(config_path))
+    print(f"Output predictions path: {cfg['output_predictions_path']}")
+
+    run_id = run_id or profiling.new_run_id()
+    log_dir = cfg.get('run_log_dir', 'data/output/run_logs')
+    profile_dir = os.path.join(log_dir, 'profiles', run_id) if profile else None
+
+    profiling.reset_run()
+    runner = StageRunner(cfg, force, dry_run, profile_dir)
+    try:
+        for name in stages:
+            runner.run(name)
+    finally:
+        if not dry_run:
+            log_path = profiling.write_run_log(log_dir, run_id, {
+                'stages': list(stages),
+                'season': cfg['season_to_predict'],
+                'gw': cfg['gw_to_predict'],
+                'startup_import_s': round(STARTUP_IMPORT_SECONDS, 4),
+            })
+            print(f"Run log saved to {log_path}")
+    return runner.state
+
+# ---------- LEAGUES ----------
+# Paths every league shares: stores already keyed by league or club, and whole-run outputs
+SHARED_PATH_KEYS = {
+    'understat_store_dir', 'elo_cache_dir', 'benchmark_baseline_path', 'benchmark_results_path',
+    'combined_predictions_path',
+}
+
+def league_list(config):
+    """(league, overrides) pairs from `leagues`, which is a list of names or a mapping of name to settings."""
+    leagues = config.get('leagues') or []
+    if isinstance(leagues, dict):
+        return [(league, overrides or {}) for league, overrides in leagues.items()]
+    return [(league, {}) for league in leagues]
+
+def league_config(config, league, overrides=None):
+    """
+    One league's config: every shared path moved into a {league} folder, then
+    its overrides applied as given, so an override path is used as written.
+    """
+    cfg = {**config, 'league': league, 'leagues': None}
+    for key, value in list(cfg.items()):
+        if key.endswith(('_path', '_dir')) and isinstance(value, str) and key not in SHARED_PATH_KEYS:
+            head, tail = os.path.split(value)
+            cfg[key] = os.path.join(head, league, tail)
+    cfg.update(overrides or {})
+    return cfg
+
+def last_run_usage(cfg):
+    """Peak RSS (MB) and total stage wall time (s) of the last logged run in cfg's run_log_dir, or Nones."""
+    log_dir = cfg.get('run_log_dir', 'data/output/run_logs')
+    runs = profiling.list_runs(log_dir)
+    if not runs:
+        return None, None
+    ran = [
+        record for record in profiling.load_run_log(log_dir, runs[-1])['records']
+        if record['kind'] == 'stage' and record['status'] != 'skipped'
+    ]
+    if not ran:
+        return None, None
+    peak = max(record.get('process_peak_rss_mb', record.get('peak_rss_mb')) for record in ran)
+    return peak, sum(record['wall_s'] for record in ran)
+
+def _run_league(job):
+    league, cfg, force, stages, profile, run_id, threads = job
+    # OpenMP libraries loaded from here on (xgboost) read the variable; numpy
+    # is already loaded through pandas, so its BLAS pool is limited with
+    # threadpoolctl around the run instead
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    cfg['n_jobs'] = threads
+    for key in ['backtest_max_workers', 'tune_max_workers']:
+        cfg[key] = cfg.get(key) or threads
+
+    # A new league starts with empty folders
+    for key, value in cfg.items():
+        if key.endswith('_path') and isinstance(value, str) and os.path.dirname(value):
+            os.makedirs(os.path.dirname(value), exist_ok=True)
+    log_dir = cfg.get('run_log_dir', 'data/output/run_logs')
+    os.makedirs(log_dir, exist_ok=True)
+    output_path = os.path.join(log_dir, f"{run_id}.out")
+    start = time.perf_counter()
+    from threadpoolctl import threadpool_limits
+    with open(output_path, 'w') as out, redirect_stdout(out), threadpool_limits(limits=threads):
+        main(force, stages=stages, profile=profile, config=cfg, run_id=run_id)
+    return {
+        'league': league,
+        'wall_s': round(time.perf_counter() - start, 2),
+        'process_peak_rss_mb': round(profiling.process_peak_rss_mb(), 1),
+        'output': output_path,
+    }
+
+def combine_predictions(league_cfgs, output_path):
+    """Stacks each league's prediction file into one, with a league column first."""
+    import pandas as pd
+
+    frames = [
+        pd.read_csv(cfg['output_predictions_path']).assign(league=league)
+        for league, cfg in league_cfgs if os.path.exists(cfg['output_predictions_path'])
+    ]
+    if not frames:
+        return None
+    combined = pd.concat(frames, ignore_index=True)
+    combined = combined[['league', *[col for col in combined.columns if col != 'league']]]
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    combined.to_csv(output_path, index=False)
+    return combined
+
+def run_leagues(config, force=(), dry_run=False, stages=PIPELINE, profile=False, only=None):
+    """
+    Runs the stages for every league in `leagues`, each league in its own process.
+
+    The processes share cpu_budget cores and memory_budget_mb of memory. As
+    many leagues run at once as both allow, judging a league's memory by the
+    peak RSS of its last logged run (league_memory_mb until it has one), and
+    each gets an equal share of the cores for XGBoost and the backtest/tune
+    pools. Leagues that took longest last time start first, so the run takes
+    about as long as the slowest league. A league's console output goes to
+    {run_id}.out in its run log folder.
+
+    The predictions of every league are then combined into combined_predictions_path.
+    Returns the leagues that failed.
+    """
+    leagues = [(league, league_config(config, league, overrides)) for league, overrides in league_list(config)]
+    if only:
+        leagues = [(league, cfg) for league, cfg in leagues if league in only]
+    if dry_run:
+        for league, cfg in leagues:
+            print(f"[dry-run] league {league}")
+            main(force, dry_run=True, stages=stages, config=cfg)
+        return []
+
+    usage = {league: last_run_usage(cfg) for league, cfg in leagues}
+    memory_mb = max(usage[league][0] or config.get('league_memory_mb', 2000) for league, _ in leagues)
+    cpu_budget = config.get('cpu_budget') or os.cpu_count() or 1
+    max_workers = min(len(leagues), cpu_budget)
+    if config.get('memory_budget_mb'):
+        max_workers = max(1, min(max_workers, int(config['memory_budget_mb'] // memory_mb)))
+    threads = max(1, cpu_budget // max_workers)
+    leagues.sort(key=lambda item: usage[item[0]][1] or float('inf'), reverse=True)
+    print(f"Running {len(leagues)} leagues on {max_workers} workers x {threads} threads "
+          f"(about {memory_mb:.0f}MB each)")
+
+    run_id = profiling.new_run_id()
+    jobs = [(league, cfg, force, stages, profile, run_id, threads) for league, cfg in leagues]
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run_league, job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            league = futures[future]
+            try:
+                result = future.result()
+                print(f"✅ {league}: {result['wall_s']:.1f}s, peak RSS {result['process_peak_rss_mb']:.0f}MB ({result['output']})")
+            except Exception as e:
+                failed.append(league)
+                print(f"⚠️ {league} failed: {e!r}")
+    print(f"⏱️  all leagues: {time.perf_counter() - start:.1f}s")
+
+    if 'predict' in stages:
+        combined_path = config.get(
+            'combined_predictions_path', 'data/output/predictions/{season_to_predict}_{date}_all_leagues.csv'
+        ).format(season_to_predict=config['season_to_predict'], date=date.today().isoformat())
+        combined = combine_predictions([(league, resolve_paths(cfg)) for league, cfg in leagues], combined_path)
+        if combined is not None:
+            print(f"Combined predictions for {combined['league'].nunique()} leagues saved to {combined_path}")
+    return failed
+
+def compare(config_path="config.yaml", base_run_id=None, new_run_id=None, threshold=0.2):
+    """Prints stage and function timings of two logged runs side by side; the last two by default."""
+    cfg = load_config(config_path)
+    log_dir = cfg.get('run_log_dir', 'data/output/run_logs')
+    runs = profiling.list_runs(log_dir)
+    if base_run_id is None or new_run_id is None:
+        if len(runs) < 2:
+            raise SystemExit(f"Need two runs in {log_dir} to compare, found {len(runs)}")
+        base_run_id, new_run_id = base_run_id or runs[-2], new_run_id or runs[-1]
+
+    comparison = profiling.compare_runs(log_dir, base_run_id, new_run_id, threshold)
+    print(f"Run {new_run_id} against {base_run_id}")
+    print(comparison.to_string(index=False))
+    regressed = comparison[comparison['regressed']]
+    if len(regressed):
+        print(f"⚠️ Regressed: {', '.join(regressed['name'])}")
+    return comparison
+
+def int_range(low, high):
+    """An argparse type for an int between low and high inclusive."""
+    def parse(value):
+        number = int(value)
+        if not low <= number <= high:
+            raise argparse.ArgumentTypeError(f"must be between {low} and {high}, got {number}")
+        return number
+    parse.__name__ = 'int'  # argparse names the type in its error for a non-number
+    return parse
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the prediction pipeline, or a single stage of it. "
+                    "Without a command the full weekly pipeline runs, skipping stages whose inputs are unchanged."
+    )
+    parser.add_argument("--config", default="config.yaml", help="Path to the pipeline config")
+    parser.add_argument(
+        "--force", action="append", default=[], choices=[*STAGES, 'all'], metavar="STAGE",
+        help=f"Re-run a stage even if its inputs are unchanged (repeatable; one of {', '.join(STAGES)} or all)"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Print which stages would run and exit")
+    parser.add_argument("--profile", action="store_true", help="Dump a cProfile of each stage next to the run log")
+    parser.add_argument(
+        "--league", action="append", default=[], metavar="LEAGUE",
+        help="With `leagues` in the config, run only this league (repeatable)"
+    )
+
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.add_parser("run", help="Full pipeline (default)")
+    for name in STAGES:
+        commands.add_parser(name, help=f"Run only the {name} stage, loading upstream outputs from disk")
+    commands.add_parser("serve", help="Serve predictions over local HTTP, reloading the model when it is retrained")
+    odds_parser = commands.add_parser("odds-stream", help="Tail an odds feed and re-score this week's bets as prices move")
+    odds_parser.add_argument("--feed", help="Feed file to tail, or - for stdin (default: odds_feed_path)")
+    odds_parser.add_argument("--from-start", action="store_true", help="Replay the feed from its first line")
+    bench_parser = commands.add_parser("benchmark", help="Time every stage on synthetic data and check it against the baseline")
+    bench_parser.add_argument("--seasons", type=int_range(1, 50), default=10, help="Synthetic seasons (1-50)")
+    bench_parser.add_argument("--leagues", type=int_range(1, 20), default=1, help="Synthetic 20-team leagues (1-20)")
+    bench_parser.add_argument("--repeats", type=int, default=3)
+    bench_parser.add_argument("--tolerance", type=float, default=0.25, help="Slowdown against the baseline that fails the run")
+    bench_parser.add_argument("--save-baseline", action="store_true", help="Store this run's times as the baseline for its scale")
+    bench_parser.add_argument("--skip-equivalence", action="store_true", help="Skip the reference-implementation checks")
+    compare_parser = commands.add_parser("compare-runs", help="Compare stage timings of two logged runs (default: the last two)")
+    compare_parser.add_argument("base_run_id", nargs="?")
+    compare_parser.add_argument("new_run_id", nargs="?")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="Wall-time growth flagged as a regression")
+    return parser.parse_args(argv)
+
+def cli(argv=None):
+    args = parse_args(argv)
+    print(f"⏱️  startup imports: {STARTUP_IMPORT_SECONDS:.2f}s")
+
+    if args.command == "serve":
+        cfg = resolve_paths(load_config(args.config))
+        with import_timer('serve'):
+            from scripts.scoring_service import serve
+        serve(
+            cfg['model_path'], cfg['label_encoder_path'], cfg['features_path'], cfg['final_trainset_path'],
+            cfg['threshold_ev'], host=cfg.get('scoring_host', '127.0.0.1'), port=cfg.get('scoring_port', 8765),
+            reload_interval=cfg.get('scoring_reload_interval', 5),
+        )
+    elif args.command == "odds-stream":
+        cfg = resolve_paths(load_config(args.config))
+        with import_timer('odds-stream'):
+            from scripts.odds_stream import run_odds_stream
+        run_odds_stream(
+            cfg['output_predictions_path'], args.feed or cfg['odds_feed_path'], cfg['threshold_ev'],
+            output_path=cfg.get('odds_stream_output_path'), poll_interval=cfg.get('odds_stream_poll_interval', 0.05),
+            from_start=args.from_start,
+        )
+    elif args.command == "benchmark":
+        cfg = load_config(args.config)
+        with import_timer('benchmark'):
+            from scripts.benchmark import run_benchmark_suite
+        ok = run_benchmark_suite(
+            cfg.get('benchmark_baseline_path', 'benchmarks/baseline.json'),
+            n_seasons=args.seasons, n_leagues=args.leagues, repeats=args.repeats, tolerance=args.tolerance,
+            save=args.save_baseline, equivalence=not args.skip_equivalence,
+            results_path=cfg.get('benchmark_results_path'),
+        )
+        if not ok:
+            raise SystemExit(1)
+    elif args.command == "compare-runs":
+        compare(args.config, args.base_run_id, args.new_run_id, args.threshold)
+    elif load_config(args.config).get('leagues'):
+        # Every league in parallel; a stage asked for by name always runs
+        stages = PIPELINE if args.command in (None, "run") else [args.command]
+        force = args.force if args.command in (None, "run") else [args.command]
+        failed = run_leagues(load_config(args.config), force, args.dry_run, stages, args.profile, args.league)
+        if failed:
+            raise SystemExit(1)
+    elif args.command in (None, "run"):
+        main(force=args.force, dry_run=args.dry_run, config_path=args.config, profile=args.profile)
+    else:
+        # A stage asked for by name always runs
+        main(force=[args.command], dry_run=args.dry_run, stages=[args.command], config_path=args.config,
+             profile=args.profile)
 
 if __name__ == "__main__":
-    main()
+    cli()
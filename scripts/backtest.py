@@ -0,0 +1,137 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.metrics import log_loss
+from scripts.baseline_model import TARGET_COL, get_feature_cols, new_classifier
+from scripts.shared_arrays import load_shared_arrays, save_shared_arrays, shared
+
+# Same order LabelEncoder gives the outcomes in train_model
+LABELS = ['A', 'D', 'H']
+
+def _fold_metrics(y_true, proba, odds, threshold):
+    """Log loss, accuracy and £1-stake returns for one scored gameweek."""
+    picks = proba.argmax(axis=1)
+    rows = np.arange(len(y_true))
+    won = picks == y_true
+    profit = np.where(won, odds[rows, picks] - 1, -1.0)
+
+    ev = proba * odds - 1
+    value_picks = ev.argmax(axis=1)
+    has_value = ev[rows, value_picks] > threshold
+    value_profit = np.where(value_picks == y_true, odds[rows, value_picks] - 1, -1.0)[has_value]
+
+    return {
+        'log_loss': round(log_loss(y_true, proba, labels=[0, 1, 2]), 4),
+        'accuracy': round(won.mean(), 4),
+        'n_bets': len(y_true),
+        'profit': round(profit.sum(), 2),
+        'roi_percent': round(profit.mean() * 100, 2),
+        'n_value_bets': int(has_value.sum()),
+        'value_profit': round(value_profit.sum(), 2),
+        'value_roi_percent': round(value_profit.mean() * 100, 2) if len(value_profit) else 0.0,
+    }
+
+def _run_fold(fold):
+    season, gw, train_end, test_rows, threshold, params, n_jobs = fold
+    X, y, odds = shared['X'], shared['y'], shared['odds']
+
+    model = new_classifier(**{**params, 'n_jobs': n_jobs})
+    model.fit(X[:train_end], y[:train_end])
+    proba = model.predict_proba(X[test_rows])
+
+    metrics = {
+        'season': season,
+        'gw': gw,
+        'n_train': train_end,
+        **_fold_metrics(y[test_rows], proba, odds[test_rows], threshold),
+    }
+    return metrics, test_rows, proba
+
+def walk_forward_folds(trainset, seasons=None, min_train_matches=380):
+    """
+    Yields (season, gw, train_end, test_rows) over a date-sorted trainset.
+
+    Each gameweek is scored by a model trained on rows [0, train_end): every
+    match played before the gameweek's first fixture.
+    """
+    dates = trainset['datetime'].to_numpy()
+    for (season, gw), test_rows in trainset.groupby(['season', 'gw'], sort=True).indices.items():
+        if seasons is not None and season not in seasons:
+            continue
+        train_end = int(np.searchsorted(dates, dates[test_rows].min(), side='left'))
+        if train_end >= min_train_matches:
+            yield int(season), int(gw), train_end, test_rows
+
+def save_backtest_predictions(df, results, output_path):
+    """Saves each scored match with its out-of-sample probabilities, in prediction-file column names."""
+    test_rows = np.concatenate([rows for _, rows, _ in results])
+    proba = np.concatenate([p for _, _, p in results])
+
+    predictions = df.iloc[test_rows][[
+        'datetime', 'season', 'gw', 'h_title', 'a_title', 'book_odds_h', 'book_odds_d', 'book_odds_a', TARGET_COL
+    ]].reset_index(drop=True)
+    for i, label in enumerate(LABELS):
+        predictions[f'pred_{label}'] = proba[:, i].round(3)
+
+    predictions = predictions.sort_values(by=['datetime', 'season', 'gw'], kind='stable')
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    predictions.to_csv(output_path, index=False)
+    print(f"Backtest predictions saved to {output_path}")
+
+def run_backtest(final_trainset, output_path, seasons=None, max_workers=None, threads_per_fold=1,
+                 min_train_matches=380, threshold=0.05, predictions_output_path=None, training_config=None):
+    """
+    Walk-forward backtest over every played (season, gw) in final_trainset.
+
+    Folds are spread over a process pool. The feature matrix is written once
+    as .npy files and memory-mapped read-only by each worker, so workers do
+    not each hold a copy. Keep threads_per_fold * max_workers near the core count.
+
+    With predictions_output_path, the out-of-sample probabilities of every
+    scored match are saved too, for strategy sweeps over past seasons.
+    training_config is a tuned config from scripts.training_config; its params
+    are used for every fold, as train_model uses them for the weekly model.
+    """
+    df = final_trainset[final_trainset[TARGET_COL].isin(LABELS)].copy()
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df = df.sort_values(by=['datetime', 'season', 'gw'], kind='stable').reset_index(drop=True)
+
+    feature_cols = get_feature_cols(df)
+    arrays = {
+        'X': df[feature_cols].to_numpy(dtype=np.float32),
+        'y': df[TARGET_COL].map({label: i for i, label in enumerate(LABELS)}).to_numpy(dtype=np.int64),
+        'odds': df[['book_odds_a', 'book_odds_d', 'book_odds_h']].to_numpy(dtype=np.float64),
+    }
+
+    params = training_config['params'] if training_config else {}
+    folds = [
+        (*fold, threshold, params, threads_per_fold)
+        for fold in walk_forward_folds(df, seasons, min_train_matches)
+    ]
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) // threads_per_fold)
+    print(f"Backtesting {len(folds)} gameweeks on {max_workers} workers x {threads_per_fold} threads")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        paths = save_shared_arrays(arrays, cache_dir)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=load_shared_arrays, initargs=(paths,)) as pool:
+            results = list(pool.map(_run_fold, folds, chunksize=max(1, len(folds) // (max_workers * 4))))
+
+    results_df = pd.DataFrame([metrics for metrics, _, _ in results]).sort_values(by=['season', 'gw']).reset_index(drop=True)
+    if predictions_output_path:
+        save_backtest_predictions(df, results, predictions_output_path)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    results_df.to_csv(output_path, index=False)
+
+    summary = results_df.groupby('season').agg(
+        gameweeks=('gw', 'count'),
+        log_loss=('log_loss', 'mean'),
+        accuracy=('accuracy', 'mean'),
+        profit=('profit', 'sum'),
+        n_bets=('n_bets', 'sum'),
+    )
+    summary['roi_percent'] = (summary['profit'] / summary['n_bets'] * 100).round(2)
+    print(summary.round(4))
+    print(f"Backtest saved to {output_path}")
+    return results_df
@@ -1,14 +1,69 @@
 import pandas as pd
 import os
 from sklearn.preprocessing import LabelEncoder
+import xgboost as xgb
 from xgboost import XGBClassifier, plot_importance
-import matplotlib.pyplot as plt
 import json
 import joblib
 from sklearn.metrics import log_loss, accuracy_score, classification_report
-import matplotlib.pyplot as plt
+from scripts.profiling import profiled
 
-def train_model(final_trainset, gw_to_predict, season_to_predict, features_path, label_encoder_path, model_path):
+TARGET_COL = 'outcome'
+NON_FEATURE_COLS = ['datetime', 'season', 'gw', 'h_title', 'a_title', TARGET_COL]
+
+def get_feature_cols(trainset):
+    return [col for col in trainset.columns if col not in NON_FEATURE_COLS]
+
+def new_classifier(**kwargs):
+    return XGBClassifier(
+        objective='multi:softprob',
+        num_class=3,
+        eval_metric='mlogloss',
+        use_label_encoder=False,
+        random_state=42,
+        **kwargs
+    )
+
+def time_decay_weights(dates, half_life_days):
+    """Sample weights that halve every half_life_days back from the latest date."""
+    age_days = (dates.max() - dates).dt.days.to_numpy()
+    return 0.5 ** (age_days / half_life_days)
+
+def previous_fit(registry_dir, season, gw, feature_cols, labels, full_refit_every, config_version=None):
+    """
+    The registered model to continue boosting from, or None with the reason a full refit is due.
+    """
+    from scripts.model_registry import model_in_use
+
+    try:
+        previous = model_in_use(registry_dir, season, gw, include_current=False)
+    except FileNotFoundError:
+        return None, "no earlier model registered"
+    if previous.feature_cols != feature_cols or list(previous.le.classes_) != list(labels):
+        return None, f"features or labels changed since {previous.version}"
+    if previous.meta.get('training_config_version') != config_version:
+        return None, f"training config changed since {previous.version}"
+    if previous.meta.get('warm_starts_since_refit', 0) + 1 >= full_refit_every:
+        return None, f"periodic full refit (every {full_refit_every} weeks)"
+    return previous, None
+
+@profiled
+def train_model(final_trainset, gw_to_predict, season_to_predict, features_path, label_encoder_path, model_path,
+                registry_dir=None, warm_start=False, warm_start_rounds=10, full_refit_every=4,
+                decay_half_life_days=None, compare_full_refit=False, training_config=None,
+                output_dir="data/output/train_eval", n_jobs=None):
+    """
+    With warm_start (needs registry_dir), boosting continues from the latest
+    registered model for warm_start_rounds more trees, fitted only on matches
+    played since that model's train_end. Every full_refit_every weeks, or when
+    the features change, the model is refitted from scratch instead.
+    decay_half_life_days weights older matches down. compare_full_refit also
+    fits a fresh model on the same data and logs how far the warm-started
+    one's metrics diverge, to warm_start_drift.csv in output_dir.
+
+    training_config is a tuned config from scripts.training_config; its params replace
+    the XGBoost defaults. n_jobs caps XGBoost's threads (all cores by default).
+    """
     # Split from gw_to_predict
     final_trainset = final_trainset[~((final_trainset['season'] == season_to_predict) & (final_trainset['gw'] == gw_to_predict))]
 
@@ -33,9 +88,8 @@ def train_model(final_trainset, gw_to_predict, season_to_predict, features_path,
     ].copy()
 
     # Drop columns not to be used as features
-    target_col = 'outcome'
-    drop_cols = ['datetime', 'season', 'gw', 'h_title', 'a_title', target_col]
-    feature_cols = [col for col in final_trainset.columns if col not in drop_cols]
+    target_col = TARGET_COL
+    feature_cols = get_feature_cols(final_trainset)
 
     with open(features_path, 'w') as f:
         json.dump(feature_cols, f)
@@ -50,15 +104,45 @@ def train_model(final_trainset, gw_to_predict, season_to_predict, features_path,
     X_test = test_df[feature_cols]
     y_test = test_df['target']
 
+    params = training_config['params'] if training_config else {}
+    if n_jobs:
+        params = {**params, 'n_jobs': n_jobs}
+    weights = time_decay_weights(train_df['datetime'], decay_half_life_days) if decay_half_life_days else None
+
+    previous, refit_reason = None, "warm start off"
+    if warm_start and registry_dir:
+        previous, refit_reason = previous_fit(
+            registry_dir, season_to_predict, gw_to_predict, feature_cols, le.classes_, full_refit_every,
+            training_config['version'] if training_config else None
+        )
+
+    if previous is not None:
+        new_rows = (train_df['datetime'] > pd.Timestamp(previous.meta['train_end'])).to_numpy()
+        if not new_rows.any():
+            previous, refit_reason = None, f"no matches played since {previous.version}"
+
     # Train XGBoost
-    model = XGBClassifier(
-        objective='multi:softprob',
-        num_class=3,
-        eval_metric='mlogloss',
-        use_label_encoder=False,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
+    if previous is not None:
+        print(f"Warm start from {previous.version}: {warm_start_rounds} more rounds on {new_rows.sum()} new matches")
+        # xgb.train rather than XGBClassifier.fit, which rejects a gameweek missing an outcome class
+        dtrain = xgb.DMatrix(
+            X_train[new_rows], y_train[new_rows],
+            weight=None if weights is None else weights[new_rows]
+        )
+        booster = xgb.train(
+            new_classifier(**params).get_xgb_params(), dtrain,
+            num_boost_round=warm_start_rounds, xgb_model=previous.booster.copy()
+        )
+        model = new_classifier(**params)
+        model.load_model(booster.save_raw())
+        fit_meta = {'fit_mode': 'warm_start', 'warm_start_from': previous.version,
+                    'warm_starts_since_refit': previous.meta.get('warm_starts_since_refit', 0) + 1}
+    else:
+        if warm_start:
+            print(f"Full refit: {refit_reason}")
+        model = new_classifier(**params)
+        model.fit(X_train, y_train, sample_weight=weights)
+        fit_meta = {'fit_mode': 'full', 'warm_starts_since_refit': 0}
 
     joblib.dump(model, model_path)
     joblib.dump(le, label_encoder_path)
@@ -83,7 +167,7 @@ def train_model(final_trainset, gw_to_predict, season_to_predict, features_path,
     results_df.to_csv(os.path.join(os.path.dirname(model_path), 'results.csv'), index=False)
 
     # Evaluate
-    output_dir = "data/output/train_eval"
+    os.makedirs(output_dir, exist_ok=True)
 
     logloss = 0 #log_loss(y_test, y_proba) 
     acc = accuracy_score(y_test, y_pred)
@@ -106,11 +190,52 @@ def train_model(final_trainset, gw_to_predict, season_to_predict, features_path,
     print("\nAccuracy:", acc)
     print("\nClassification Report:\n", classification_report(y_test, y_pred, target_names=le.classes_))
 
-    # Feature Importance Plot
+    # Feature Importance Plot (matplotlib is only needed here)
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 6))
     plot_importance(model, max_num_features=10, importance_type='gain', show_values=False)
     plt.tight_layout()
     plt.savefig(os.path.join(output_dir, "feature_importance.png"))
     plt.close()
 
+    if previous is not None and compare_full_refit:
+        log_warm_start_drift(model, params, X_train, y_train, weights, X_test, y_test, season_to_predict, gw_to_predict, output_dir)
+
+    # Keep every week's model, not just the latest
+    if registry_dir:
+        from scripts.model_registry import register_model
+        register_model(model, le, feature_cols, registry_dir, season_to_predict, gw_to_predict, {
+            'n_train': len(train_df),
+            'train_start': str(train_df['datetime'].min().date()),
+            'train_end': str(train_df['datetime'].max().date()),
+            'eval_season': int(latest_season),
+            'eval_gw': int(latest_gw),
+            'eval_accuracy': round(acc, 4),
+            'decay_half_life_days': decay_half_life_days,
+            'training_config_version': training_config['version'] if training_config else None,
+            **fit_meta,
+        })
+
     return model, le, feature_cols, results_df
+
+def log_warm_start_drift(model, params, X_train, y_train, weights, X_test, y_test, season, gw, output_dir):
+    """Fits a fresh model on the same data and appends both models' held-out metrics to warm_start_drift.csv."""
+    full_model = new_classifier(**params)
+    full_model.fit(X_train, y_train, sample_weight=weights)
+
+    warm_proba = model.predict_proba(X_test)
+    full_proba = full_model.predict_proba(X_test)
+    row = pd.DataFrame([{
+        'season': season,
+        'gw': gw,
+        'warm_log_loss': round(log_loss(y_test, warm_proba, labels=[0, 1, 2]), 4),
+        'full_log_loss': round(log_loss(y_test, full_proba, labels=[0, 1, 2]), 4),
+        'warm_accuracy': round(accuracy_score(y_test, warm_proba.argmax(axis=1)), 4),
+        'full_accuracy': round(accuracy_score(y_test, full_proba.argmax(axis=1)), 4),
+        'mean_abs_proba_diff': round(float(abs(warm_proba - full_proba).mean()), 4),
+        'pick_agreement': round(float((warm_proba.argmax(axis=1) == full_proba.argmax(axis=1)).mean()), 4),
+    }])
+
+    drift_path = os.path.join(output_dir, "warm_start_drift.csv")
+    row.to_csv(drift_path, mode='a', header=not os.path.exists(drift_path), index=False)
+    print("\nWarm start vs full refit:\n", row.to_string(index=False))
@@ -0,0 +1,323 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+
+TEAMS_PER_LEAGUE = 20
+
+def _round_robin(n_teams):
+    """Double round-robin by the circle method: 2 * (n_teams - 1) rounds of (home, away) index pairs."""
+    teams = list(range(n_teams))
+    rounds = []
+    for r in range(n_teams - 1):
+        pairs = [(teams[i], teams[n_teams - 1 - i]) for i in range(n_teams // 2)]
+        rounds.append([(a, b) if r % 2 else (b, a) for a, b in pairs])
+        teams = [teams[0], teams[-1], *teams[1:-1]]
+    return rounds + [[(b, a) for a, b in pairs] for pairs in rounds]
+
+def _to_fractional(decimal_odds):
+    fraction = Fraction(float(decimal_odds) - 1).limit_denominator(20)
+    return f"{fraction.numerator}/{fraction.denominator}"
+
+def synthetic_tables(n_seasons=10, n_leagues=1, start_year=2000, seed=0):
+    """
+    Match, Elo, squad and fixture tables shaped like the raw Understat, ClubElo,
+    squad and fixture-list inputs, so benchmarks run without network access.
+
+    Each league plays a 20-team double round-robin per season from mid-August,
+    with goals and xG driven by drifting team strengths. The fixture list holds
+    gameweek 1 of the season after the last one, with fractional odds.
+    """
+    rng = np.random.default_rng(seed)
+    rounds = _round_robin(TEAMS_PER_LEAGUE)
+    n_teams = n_leagues * TEAMS_PER_LEAGUE
+    team_ids = np.arange(n_teams) + 1
+    titles = np.array([f"L{i // TEAMS_PER_LEAGUE + 1:02d} Team {i % TEAMS_PER_LEAGUE + 1:02d}" for i in range(n_teams)])
+    strength = rng.normal(0, 0.35, size=(n_seasons + 1, n_teams)).cumsum(axis=0) * 0.5
+
+    rows = []
+    for s in range(n_seasons + 1):
+        season_start = pd.Timestamp(f"{start_year + s}-08-10")
+        for r, pairs in enumerate(rounds if s < n_seasons else rounds[:1]):
+            for league in range(n_leagues):
+                for k, (h, a) in enumerate(pairs):
+                    rows.append((s, r, season_start + pd.Timedelta(days=7 * r + k % 3, hours=12 + k % 8),
+                                 league * TEAMS_PER_LEAGUE + h, league * TEAMS_PER_LEAGUE + a))
+    games = pd.DataFrame(rows, columns=['s', 'round', 'datetime', 'h', 'a'])
+
+    diff = strength[games['s'], games['h']] - strength[games['s'], games['a']]
+    lambda_h = np.exp(0.3 + 0.25 + diff / 2)
+    lambda_a = np.exp(0.3 - diff / 2)
+    p_draw = np.clip(0.28 - 0.08 * np.abs(diff), 0.15, None)
+    p_home = (1 - p_draw) / (1 + np.exp(-1.6 * diff - 0.3))
+    p_away = 1 - p_draw - p_home
+
+    played = games['s'] < n_seasons
+    matches = pd.DataFrame({
+        'id': np.arange(len(games)) + 1,
+        'isResult': True,
+        'datetime': games['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'season': start_year + games['s'],
+        'h_id': team_ids[games['h']],
+        'h_title': titles[games['h']],
+        'h_short_title': [title[-7:] for title in titles[games['h']]],
+        'a_id': team_ids[games['a']],
+        'a_title': titles[games['a']],
+        'a_short_title': [title[-7:] for title in titles[games['a']]],
+        'goals_h': rng.poisson(lambda_h),
+        'goals_a': rng.poisson(lambda_a),
+        'xG_h': (lambda_h * rng.gamma(8, 1 / 8, len(games))).round(6),
+        'xG_a': (lambda_a * rng.gamma(8, 1 / 8, len(games))).round(6),
+        'forecast_w': p_home.round(4),
+        'forecast_d': p_draw.round(4),
+        'forecast_l': p_away.round(4),
+    })
+
+    upcoming = matches[~played.to_numpy()]
+    margin = 1.05
+    fixtures = pd.DataFrame({
+        'gw': 1,
+        'datetime': pd.to_datetime(upcoming['datetime']).dt.strftime('%Y-%m-%d'),
+        'season': upcoming['season'],
+        'h_id': upcoming['h_id'],
+        'h_title': upcoming['h_title'],
+        'a_id': upcoming['a_id'],
+        'a_title': upcoming['a_title'],
+        'goals_h': np.nan, 'goals_a': np.nan, 'xG_h': np.nan, 'xG_a': np.nan, 'outcome': np.nan,
+        'book_odds_h': [_to_fractional(1 / (p * margin)) for p in upcoming['forecast_w']],
+        'book_odds_d': [_to_fractional(1 / (p * margin)) for p in upcoming['forecast_d']],
+        'book_odds_a': [_to_fractional(1 / (p * margin)) for p in upcoming['forecast_l']],
+    })
+    matches = matches[played.to_numpy()].reset_index(drop=True)
+
+    squad = pd.DataFrame({
+        'id': np.tile(team_ids, n_seasons + 1),
+        'title': np.tile(titles, n_seasons + 1),
+        'season': np.repeat(start_year + np.arange(n_seasons + 1), n_teams),
+        'avg_age': rng.normal(26.5, 1.2, n_teams * (n_seasons + 1)).round(1),
+        'total_market_value': np.exp(6 + strength.ravel()).round(0),
+    })
+
+    # ClubElo-style weekly intervals per team, spanning every match and fixture
+    weeks = pd.date_range(f"{start_year - 1}-07-01", f"{start_year + n_seasons + 1}-07-01", freq='7D')
+    week_season = np.clip(weeks.year - start_year - (weeks.month < 7), 0, n_seasons)
+    elo = 1500 + 200 * strength[week_season] + rng.normal(0, 8, (len(weeks), n_teams)).cumsum(axis=0) * 0.3
+    elo_df = pd.DataFrame({
+        'title': np.repeat(titles, len(weeks) - 1),
+        'Rank': np.nan,
+        'Club': np.repeat(titles, len(weeks) - 1),
+        'Country': 'SYN',
+        'Level': 1,
+        'Elo': elo[:-1].T.ravel().round(8),
+        'From': np.tile(weeks[:-1].strftime('%Y-%m-%d'), n_teams),
+        'To': np.tile((weeks[1:] - pd.Timedelta(days=1)).strftime('%Y-%m-%d'), n_teams),
+    })
+
+    return {
+        'matches': matches,
+        'elo': elo_df,
+        'squad': squad,
+        'fixtures': fixtures,
+        'season_to_predict': start_year + n_seasons,
+        'gw_to_predict': 1,
+    }
+
+def _timed(func, make_args, repeats):
+    """Calls func(*make_args()) repeats times, timing only the call; returns the times and the last result."""
+    times = []
+    for _ in range(repeats):
+        args = make_args()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(*args)
+            times.append(time.perf_counter() - start)
+    return times, result
+
+def run_benchmarks(n_seasons=10, n_leagues=1, repeats=3, seed=0):
+    """
+    Times each pipeline stage on synthetic data, fed by the previous stage's
+    output. Runs in a scratch directory, since stages write to relative paths.
+    """
+    from scripts.baseline_model import train_model
+    from scripts.data_align import prep_trainset
+    from scripts.feature_engineering import engineer_features
+    from scripts.predict import predict_gw
+    from scripts.simulate_returns import simulate_bets
+
+    tables = synthetic_tables(n_seasons, n_leagues, seed=seed)
+    season, gw = tables['season_to_predict'], tables['gw_to_predict']
+    rows = []
+
+    def record(stage, times, n_rows):
+        rows.append({
+            'n_seasons': n_seasons, 'n_leagues': n_leagues, 'stage': stage, 'rows': n_rows, 'repeats': repeats,
+            'min_s': round(min(times), 4), 'median_s': round(float(np.median(times)), 4),
+        })
+        print(f"  {stage:<18} {min(times):8.3f}s min  {np.median(times):8.3f}s median  ({n_rows} rows)")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            os.makedirs('data/output/train_eval', exist_ok=True)
+            os.makedirs('models', exist_ok=True)
+            tables['squad'].to_csv('squad.csv', index=False)
+            tables['fixtures'].to_csv('fixtures.csv', index=False)
+            print(f"Benchmarking {n_seasons} seasons x {n_leagues} leagues ({len(tables['matches'])} matches)")
+
+            times, merged = _timed(prep_trainset, lambda: (
+                tables['matches'].copy(), tables['elo'], 'squad.csv', 'fixtures.csv', 'merged.csv', gw, season
+            ), repeats)
+            record('prep_trainset', times, len(merged))
+
+            times, final = _timed(engineer_features, lambda: (merged.copy(), 'final.csv'), repeats)
+            record('engineer_features', times, len(final))
+
+            times, trained = _timed(train_model, lambda: (
+                final.copy(), gw, season, 'models/feature_cols.json', 'models/label_encoder.pkl', 'models/xgb_model.pkl'
+            ), repeats)
+            model, le, feature_cols, _ = trained
+            record('train_model', times, len(final))
+
+            # Bet the bookmaker favourite on every played match, for a results table of benchmark size
+            played = final[final['outcome'].isin(['H', 'D', 'A'])]
+            results = played[['datetime', 'h_title', 'a_title', 'book_odds_h', 'book_odds_d', 'book_odds_a', 'outcome']].copy()
+            results['prediction'] = np.array(['H', 'D', 'A'])[played[['book_odds_h', 'book_odds_d', 'book_odds_a']].to_numpy().argmin(axis=1)]
+            times, _ = _timed(simulate_bets, lambda: (results,), repeats)
+            record('simulate_bets', times, len(results))
+
+            times, predictions = _timed(predict_gw, lambda: (
+                gw, season, 0.05, model, le, feature_cols, 'final.csv', 'predictions.csv'
+            ), repeats)
+            record('predict_gw', times, len(predictions))
+        finally:
+            os.chdir(cwd)
+
+    return pd.DataFrame(rows)
+
+def _assert_same(name, actual, expected, keys=('datetime', 'h_id', 'a_id')):
+    """Frames equal value for value, once put in the same row order by keys."""
+    keys = [key for key in keys if key in actual.columns]
+    actual = actual.sort_values(by=keys, kind='stable').reset_index(drop=True)
+    expected = expected.sort_values(by=keys, kind='stable').reset_index(drop=True)[actual.columns]
+    try:
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_exact=True)
+        return {'check': name, 'passed': True, 'detail': f"{len(actual)} rows identical"}
+    except AssertionError as e:
+        return {'check': name, 'passed': False, 'detail': str(e).splitlines()[0]}
+
+def check_equivalence(n_seasons=3, n_leagues=1, seed=1):
+    """
+    Checks the optimised paths against the reference implementations in
+    scripts.reference, and the incremental feature store against a full rebuild,
+    on small synthetic data.
+    """
+    from scripts import reference
+    from scripts.data_align import add_gw, clean_and_convert_to_odds, encode_outcome, merge_elo_ratings, merge_squad_values
+    from scripts.feature_engineering import add_recent_form, engineer_stat_diff, generate_h2h_features
+    from scripts.feature_store import update_feature_store, verify_feature_store
+
+    tables = synthetic_tables(n_seasons, n_leagues, seed=seed)
+    matches = tables['matches'].copy()
+    matches['outcome'] = matches.apply(encode_outcome, axis=1)
+    matches = clean_and_convert_to_odds(add_gw(matches))
+    trainset = merge_squad_values(matches, tables['squad'])
+
+    checks = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        merged = merge_elo_ratings(trainset, tables['elo'])
+        checks.append(_assert_same('merge_elo_ratings', merged, reference.reference_merge_elo_ratings(trainset, tables['elo'])))
+
+    stats = engineer_stat_diff(merged.copy())
+    checks.append(_assert_same('generate_h2h_features', generate_h2h_features(stats.copy()), reference.reference_h2h_features(stats.copy())))
+    expected_form = reference.reference_recent_form(reference.reference_recent_form(stats.copy(), 'h_id', 'h'), 'a_id', 'a')
+    checks.append(_assert_same('add_recent_form', add_recent_form(stats.copy()), expected_form))
+
+    bets = stats.copy()
+    bets['prediction'] = np.array(['H', 'D', 'A'])[np.arange(len(bets)) % 3]
+    odds = np.select(
+        [bets['prediction'] == 'H', bets['prediction'] == 'D'], [bets['book_odds_h'], bets['book_odds_d']],
+        default=bets['book_odds_a']
+    )
+    same_odds = np.array_equal(odds, reference.reference_bet_odds(bets).to_numpy())
+    checks.append({'check': 'simulate_bets odds', 'passed': same_odds, 'detail': f"{len(bets)} bets"})
+
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(io.StringIO()):
+        store_path = os.path.join(work_dir, 'feature_store.csv')
+        cutoff = merged['datetime'].sort_values().iloc[len(merged) * 2 // 3]
+        update_feature_store(merged[merged['datetime'] < cutoff].copy(), store_path)
+        features = update_feature_store(merged.copy(), store_path)
+        try:
+            verify_feature_store(features, merged.copy())
+            checks.append({'check': 'feature store', 'passed': True, 'detail': 'incremental update matches a full rebuild'})
+        except ValueError as e:
+            checks.append({'check': 'feature store', 'passed': False, 'detail': str(e).splitlines()[0]})
+
+    return pd.DataFrame(checks)
+
+def scale_key(n_seasons, n_leagues):
+    return f"{n_seasons}_seasons_{n_leagues}_leagues"
+
+def load_baselines(baseline_path):
+    if not os.path.exists(baseline_path):
+        return {}
+    with open(baseline_path, 'r') as f:
+        return json.load(f)
+
+def save_baseline(results, baseline_path):
+    """Stores each stage's best time under its scale, keeping baselines for other scales."""
+    baselines = load_baselines(baseline_path)
+    for (n_seasons, n_leagues), group in results.groupby(['n_seasons', 'n_leagues']):
+        baselines[scale_key(n_seasons, n_leagues)] = {
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'stages': {row['stage']: {'min_s': row['min_s'], 'rows': int(row['rows'])} for _, row in group.iterrows()},
+        }
+    os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+    with open(baseline_path, 'w') as f:
+        json.dump(baselines, f, indent=2)
+    print(f"Baseline saved to {baseline_path}")
+
+def compare_to_baseline(results, baseline_path, tolerance=0.25, min_seconds=0.05):
+    """Adds each stage's baseline time and flags stages slower than it by more than tolerance (and min_seconds)."""
+    baselines = load_baselines(baseline_path)
+    results = results.copy()
+    results['baseline_s'] = [
+        baselines.get(scale_key(row['n_seasons'], row['n_leagues']), {}).get('stages', {}).get(row['stage'], {}).get('min_s')
+        for _, row in results.iterrows()
+    ]
+    baseline = results['baseline_s'].astype(float)
+    results['change_percent'] = ((results['min_s'] - baseline) / baseline * 100).round(1)
+    results['regressed'] = (results['min_s'] > baseline * (1 + tolerance)) & (results['min_s'] - baseline > min_seconds)
+    return results
+
+def run_benchmark_suite(baseline_path, n_seasons=10, n_leagues=1, repeats=3, tolerance=0.25,
+                        save=False, equivalence=True, results_path=None):
+    """
+    Benchmarks every stage, checks equivalence with the reference implementations
+    and compares against the stored baseline. Returns False when a stage
+    regressed beyond tolerance or an equivalence check failed.
+    """
+    ok = True
+    if equivalence:
+        checks = check_equivalence()
+        print(checks.to_string(index=False))
+        ok = bool(checks['passed'].all())
+
+    results = compare_to_baseline(run_benchmarks(n_seasons, n_leagues, repeats), baseline_path, tolerance)
+    print(results[['stage', 'rows', 'min_s', 'baseline_s', 'change_percent', 'regressed']].to_string(index=False))
+    if results_path:
+        os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+        results.to_csv(results_path, mode='a', header=not os.path.exists(results_path), index=False)
+
+    regressed = results[results['regressed']]
+    if len(regressed):
+        print(f"⚠️ Regressed beyond {tolerance:.0%}: {', '.join(regressed['stage'])}")
+        ok = False
+    if save:
+        save_baseline(results, baseline_path)
+    return ok
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+import pandas as pd
+
+# Everything report.py shows, computed once per pipeline run: prediction
+# cards already rendered to markdown, the last gameweek's bet review, the
+# metric series behind its charts and the model's feature importance. The
+# version is a hash of the content, written next to the bundle so the report
+# can check it on every rerun without loading the bundle itself.
+
+CARD_TEMPLATE = """
+**🗓️ {datetime}**
+### {h_title} 🆚 {a_title}  
+**Model Prediction:** `{predicted_outcome}`  
+**Best Value Bet:** `{bet_decision}`  
+---
+| Model Predictions      | Bookie Odds        |
+|:---------------------:|:------------------:|
+| 🏠 {pred_H:.1f}%       | 🏠 {book_odds_h:.2f}    |
+| 🤝 {pred_D:.1f}%       | 🤝 {book_odds_d:.2f}    |
+| 🛫 {pred_A:.1f}%       | 🛫 {book_odds_a:.2f}    |
+"""
+
+TABLE_COLS = [
+    'datetime', 'h_title', 'a_title', 'book_odds_h', 'book_odds_d', 'book_odds_a',
+    'pred_H', 'pred_D', 'pred_A', 'predicted_outcome', 'bet_decision',
+]
+DETAIL_COLS = ['datetime', 'h_title', 'a_title', 'prediction', 'outcome', 'profit']
+
+def version_path(bundle_path):
+    return os.path.splitext(bundle_path)[0] + '.version'
+
+def read_version(bundle_path):
+    """The bundle's version stamp, None before the first bundle is built."""
+    path = version_path(bundle_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+def read_bundle(bundle_path):
+    with open(bundle_path, 'r') as f:
+        return json.load(f)
+
+def prediction_cards(predictions):
+    return [
+        CARD_TEMPLATE.format(**{
+            **row,
+            'predicted_outcome': str(row['predicted_outcome']).upper(),
+            'bet_decision': str(row['bet_decision']).upper(),
+            'pred_H': row['pred_H'] * 100,
+            'pred_D': row['pred_D'] * 100,
+            'pred_A': row['pred_A'] * 100,
+        })
+        for row in predictions.to_dict('records')
+    ]
+
+def feature_importance(model, max_features=10):
+    """Top features by gain, as plot_importance ranks them in train_model."""
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    scores = booster.get_score(importance_type='gain')
+    top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:max_features]
+    return [{'feature': name, 'gain': round(float(gain), 4)} for name, gain in top]
+
+def _records(df):
+    # JSON has no NaN
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def build_dashboard_bundle(bundle_path, predictions_path, sim_output_dir, model=None, history_store_dir=None,
+                           storage_format='csv'):
+    """
+    Writes the dashboard bundle to bundle_path and its version stamp next to
+    it, and returns the version. Inputs a run has not produced yet (no bets
+    simulated, no settled history) are left out of the bundle.
+    """
+    predictions = pd.read_csv(predictions_path)
+    bundle = {
+        'season': int(predictions['season'].iloc[0]),
+        'gw': int(predictions['gw'].iloc[0]),
+        'cards': prediction_cards(predictions),
+        'predictions': _records(predictions[TABLE_COLS]),
+    }
+
+    summary_path = os.path.join(sim_output_dir, 'last_gw_sim_summary.csv')
+    details_path = os.path.join(sim_output_dir, 'last_gw_sim_details.csv')
+    if os.path.exists(summary_path) and os.path.exists(details_path):
+        summary = pd.read_csv(summary_path).iloc[0]
+        bundle['bet_summary'] = {
+            'total_bets': int(summary['total_bets']),
+            'total_profit': float(summary['total_profit']),
+            'roi_percent': float(summary['roi_percent']),
+        }
+        bundle['bet_details'] = _records(pd.read_csv(details_path)[DETAIL_COLS])
+
+    acc_path = os.path.join(sim_output_dir, 'train_acc.csv')
+    if os.path.exists(acc_path):
+        # One point per gameweek; a retrained gameweek keeps its latest score
+        accuracy = pd.read_csv(acc_path).drop_duplicates(subset=['season', 'gw'], keep='last')
+        bundle['accuracy'] = _records(accuracy[['season', 'gw', 'accuracy', 'log_loss']])
+
+    if history_store_dir:
+        from scripts.prediction_history import roi_by_gameweek
+        roi = roi_by_gameweek(history_store_dir, bundle['season'], storage_format)
+        if len(roi):
+            bundle['roi'] = _records(roi[['gw', 'profit', 'cumulative_profit', 'roi_percent', 'cumulative_roi_percent']])
+
+    if model is not None:
+        bundle['feature_importance'] = feature_importance(model)
+
+    content = json.dumps(bundle, sort_keys=True)
+    version = hashlib.sha256(content.encode()).hexdigest()[:16]
+    bundle = {'version': version, 'built_at': datetime.now().isoformat(timespec='seconds'), **bundle}
+
+    # Bundle first, then the stamp, each swapped in whole, so a reader that
+    # sees a new version always finds the matching bundle
+    os.makedirs(os.path.dirname(bundle_path) or '.', exist_ok=True)
+    for path, text in [(bundle_path, json.dumps(bundle)), (version_path(bundle_path), version)]:
+        with open(path + '.tmp', 'w') as f:
+            f.write(text)
+        os.replace(path + '.tmp', path)
+    print(f"Dashboard bundle {version} saved to {bundle_path}")
+    return version
@@ -1,21 +1,18 @@
 import pandas as pd
 import numpy as np
-
-def fractional_to_decimal(fraction_str):
-    try:
-        numerator, denominator = map(float, str(fraction_str).split('/'))
-        return round((numerator / denominator) + 1, 3)
-    except:
-        return np.nan
+from scripts.elo_timeline import EloTimeline
+from scripts.odds import parse_odds
+from scripts.storage import SCHEMAS, write_table
+from scripts.profiling import profiled
 
 def clean_fixtures(fixtures_df, gw, season):
-    fixtures_df = fixtures_df[(fixtures_df['gw'] == gw) & (fixtures_df['season'] == season)]
+    fixtures_df = fixtures_df[(fixtures_df['gw'] == gw) & (fixtures_df['season'] == season)].copy()
 
     fixtures_df['datetime'] = pd.to_datetime(fixtures_df['datetime']).dt.strftime('%Y-%m-%d')
 
-    fixtures_df['book_odds_h'] = fixtures_df['book_odds_h'].apply(fractional_to_decimal)
-    fixtures_df['book_odds_d'] = fixtures_df['book_odds_d'].apply(fractional_to_decimal)
-    fixtures_df['book_odds_a'] = fixtures_df['book_odds_a'].apply(fractional_to_decimal)
+    # Fractional, decimal or American prices, parsed a column at a time
+    for col in ['book_odds_h', 'book_odds_d', 'book_odds_a']:
+        fixtures_df[col] = parse_odds(fixtures_df[col])
     
     fixtures_df = fixtures_df.dropna(subset=['book_odds_h', 'book_odds_d', 'book_odds_a'])
     return fixtures_df
@@ -76,6 +73,52 @@ def merge_squad_values(matches_df, squad_data):
     trainset = trainset.drop(columns=['id_x', 'id_y', 'title_h', 'title_a'])
     return trainset
 
+def build_elo_index(elo_data):
+    """
+    Holds each team's Elo history as From-sorted arrays for interval lookups.
+
+    Returns {title: {'From': ..., 'To': ..., 'Elo': ...}} where 'To' is made
+    inclusive of the whole end day.
+    """
+    elo_data = elo_data.dropna(subset=['title', 'From', 'To'])
+    from_dates = pd.to_datetime(elo_data['From']).to_numpy()
+    to_dates = (pd.to_datetime(elo_data['To']) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)).to_numpy()
+    elo = elo_data['Elo'].to_numpy(dtype=float)
+
+    elo_index = {}
+    for title, positions in elo_data.groupby('title', sort=False).indices.items():
+        order = positions[np.argsort(from_dates[positions], kind='stable')]
+        elo_index[title] = {
+            'From': from_dates[order],
+            'To': to_dates[order],
+            'Elo': elo[order],
+        }
+    return elo_index
+
+def lookup_elo(elo_index, titles, dates):
+    """
+    Returns the Elo in force for each (title, date) pair.
+
+    Each team's fixtures are resolved with one binary search against that
+    team's interval starts. Dates before the first interval, after the last,
+    or between two intervals come back as NaN.
+    """
+    titles = pd.Series(titles).reset_index(drop=True)
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    elo = np.full(len(titles), np.nan)
+
+    for title, positions in titles.groupby(titles, sort=False).indices.items():
+        intervals = elo_index.get(title)
+        if intervals is None:
+            continue
+        fixture_dates = dates[positions]
+        i = np.searchsorted(intervals['From'], fixture_dates, side='right') - 1
+        i_clipped = np.clip(i, 0, None)
+        found = (i >= 0) & (fixture_dates <= intervals['To'][i_clipped])
+        elo[positions[found]] = intervals['Elo'][i_clipped[found]]
+    return elo
+
+@profiled
 def merge_elo_ratings(trainset, elo_data, date_col='datetime'):
     """
     Merge Elo ratings into fixture data based on date ranges and team names.
@@ -83,49 +126,32 @@ def merge_elo_ratings(trainset, elo_data, date_col='datetime'):
     Adds 'h_elo' and 'a_elo' columns to trainset using elo_data, matching:
     - h_title/a_title to elo_data['title']
     - datetime to elo_data[From:To] date interval
+
+    elo_data may also be an EloTimeline, which answers the same lookups.
+    Fixtures with no Elo interval for either side are reported and dropped.
     """
-    # Ensure all relevant columns are datetime
-    trainset = trainset.copy()
+    trainset = trainset.copy().reset_index(drop=True)
     trainset[date_col] = pd.to_datetime(trainset[date_col])
-    elo_data = elo_data.copy()
-    elo_data['From'] = pd.to_datetime(elo_data['From'])
-    elo_data['To'] = pd.to_datetime(elo_data['To']) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)  # make 'To' inclusive
-
-    def merge_side(fixtures_df, elo_df, team_col, prefix):
-        # Merge fixtures with Elo data on team name
-        merged = fixtures_df.merge(
-            elo_df,
-            left_on=team_col,
-            right_on='title',
-            how='left'
-        )
-
-        # Filter for rows where fixture datetime falls within Elo date range
-        in_range = (merged[date_col] >= merged['From']) & (merged[date_col] <= merged['To'])
-        merged = merged[in_range]
-
-        # Keep only necessary columns
-        merged = merged[[*fixtures_df.columns, 'Elo']]
-        merged = merged.rename(columns={'Elo': f'{prefix}_elo'})
-
-        return merged.drop_duplicates(subset=fixtures_df.columns)
+    if isinstance(elo_data, EloTimeline):
+        lookup = elo_data.lookup
+    else:
+        elo_index = build_elo_index(elo_data)
+        lookup = lambda titles, dates: lookup_elo(elo_index, titles, dates)
 
     print("Merging home team Elo...")
-    fixtures_with_home = merge_side(trainset, elo_data, 'h_title', 'h')
+    trainset['h_elo'] = lookup(trainset['h_title'], trainset[date_col])
 
     print("Merging away team Elo...")
-    fixtures_with_both = merge_side(fixtures_with_home, elo_data, 'a_title', 'a')
-
-    # Final check on missing values
-    if 'h_elo' in fixtures_with_both.columns:
-        h_na = fixtures_with_both['h_elo'].isna().sum()
-        print(f"Missing h_elo: {h_na} / {len(fixtures_with_both)}")
+    trainset['a_elo'] = lookup(trainset['a_title'], trainset[date_col])
 
-    if 'a_elo' in fixtures_with_both.columns:
-        a_na = fixtures_with_both['a_elo'].isna().sum()
-        print(f"Missing a_elo: {a_na} / {len(fixtures_with_both)}")
+    # Report fixtures falling outside every Elo interval
+    for prefix in ['h', 'a']:
+        missing = trainset[trainset[f'{prefix}_elo'].isna()]
+        print(f"Missing {prefix}_elo: {len(missing)} / {len(trainset)}")
+        for _, row in missing.iterrows():
+            print(f"  [!] No Elo for {row[f'{prefix}_title']} on {row[date_col]:%Y-%m-%d}")
 
-    return fixtures_with_both
+    return trainset.dropna(subset=['h_elo', 'a_elo']).reset_index(drop=True)
 
 def prep_trainset(matches_df, elo_df, raw_squad_data_path, raw_fixtures_path, merged_trainset_path, gw_to_predict, season_to_predict):
     squad_data = pd.read_csv(raw_squad_data_path)
@@ -143,6 +169,6 @@ def prep_trainset(matches_df, elo_df, raw_squad_data_path, raw_fixtures_path, me
     trainset = merge_elo_ratings(trainset, elo_df)
     print("Merged squad and Elo ratings")
 
-    trainset.to_csv(merged_trainset_path, index=False)
+    write_table(trainset, merged_trainset_path, SCHEMAS['trainset'])
     print(f"Trainset saved")
     return trainset
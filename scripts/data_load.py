@@ -1,17 +1,104 @@
 import pandas as pd
 import ast
+import json
+import os
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
 from io import StringIO
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Optional, Set, Tuple
+from urllib3.util.retry import Retry
 import sys
+from scripts.storage import SCHEMAS, read_table, write_table
+from scripts.profiling import network_byte_hook, profiled
 
-def fetch_match_data(client, start_year: int, end_year: int, league: str) -> pd.DataFrame:
+def understat_store_path(store_dir: str, league: str, kind: str, year: int) -> str:
+    return os.path.join(store_dir, league, kind, f"{year}.json")
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _write_json(path: str, payload) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+def open_seasons(store_dir: Optional[str], league: str, start_year: int, end_year: int,
+                 close_after_days: Optional[int] = None, today: Optional[date] = None) -> Set[int]:
+    """
+    Returns the seasons that have to be fetched from Understat.
+
+    A season is frozen once it is stored with a result for every match,
+    whatever its year, so a season stored part-way through keeps being
+    refreshed after end_year moves on. With close_after_days it is also
+    frozen once its last scheduled match is that many days old, so a match
+    postponed and never played does not keep it open for good. Without a
+    store every season is open.
+    """
+    seasons = set(range(start_year, end_year + 1))
+    if not store_dir:
+        return seasons
+
+    today = today or date.today()
+    open_years = set()
+    for year in seasons:
+        matches = _read_json(understat_store_path(store_dir, league, "matches", year))
+        if matches is None:
+            open_years.add(year)
+            continue
+        unplayed = [m for m in matches if not m.get("isResult")]
+        if not unplayed:
+            continue
+        scheduled = [pd.to_datetime(m["datetime"]).date() for m in matches if m.get("datetime")]
+        last_scheduled = max(scheduled, default=today)
+        if close_after_days is not None and (today - last_scheduled).days > close_after_days:
+            print(f"⚠️  {league} {year}: closed with {len(unplayed)} unplayed matches, "
+                  f"last scheduled {last_scheduled}")
+            continue
+        open_years.add(year)
+    return open_years
+
+def load_understat_season(client, league: str, kind: str, year: int, store_dir: Optional[str] = None,
+                          refresh: bool = True, offline: bool = False):
+    """Returns one season's raw Understat payload, from the season store unless it needs refreshing."""
+    path = understat_store_path(store_dir, league, kind, year) if store_dir else None
+    stored = _read_json(path) if path else None
+
+    if stored is not None and (not refresh or offline):
+        return stored
+    if offline:
+        raise FileNotFoundError(f"No stored Understat {kind} for {league} {year} in {store_dir}")
+
+    if kind == "matches":
+        payload = client.league(league).get_match_data(season=str(year))
+    else:
+        payload = client.league(league).get_team_data(season=str(year))
+
+    if path:
+        if kind == "matches" and stored is not None:
+            new_results = sum(bool(m.get("isResult")) for m in payload) - sum(bool(m.get("isResult")) for m in stored)
+            print(f"{league} {year}: {new_results} new results since last run")
+        _write_json(path, payload)
+    return payload
+
+def fetch_match_data(client, start_year: int, end_year: int, league: str, store_dir: Optional[str] = None,
+                     refresh_seasons: Optional[Set[int]] = None, offline: bool = False) -> pd.DataFrame:
     """Fetches all match data for a league across seasons."""
     all_matches: List[Dict] = []
+    if refresh_seasons is None:
+        refresh_seasons = open_seasons(store_dir, league, start_year, end_year)
 
     for year in range(start_year, end_year + 1):
         try:
-            matches = client.league(league).get_match_data(season=str(year))
+            matches = load_understat_season(
+                client, league, "matches", year, store_dir, refresh=year in refresh_seasons, offline=offline
+            )
             for m in matches:
                 m["season"] = year
             all_matches.extend(matches)
@@ -22,77 +109,122 @@ def fetch_match_data(client, start_year: int, end_year: int, league: str) -> pd.
     df = pd.json_normalize(all_matches, sep="_")
     return df
 
-def fetch_team_data(df_matches, client, start_year: int, end_year: int, league: str) -> pd.DataFrame:
-    """Fetches team-level summary data across seasons."""
+def fetch_team_data(df_matches, client, start_year: int, end_year: int, league: str, store_dir: Optional[str] = None,
+                    refresh_seasons: Optional[Set[int]] = None, offline: bool = False,
+                    team_matches_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Fetches team-level summary data across seasons, optionally saving the
+    per-team-match table. With a saved table at team_matches_path, seasons
+    that are not being refreshed are taken from it instead of re-flattening
+    their stored payloads.
+    """
     all_team_data: List[Dict] = []
+    if refresh_seasons is None:
+        refresh_seasons = open_seasons(store_dir, league, start_year, end_year)
+
+    saved = pd.DataFrame(columns=['id', 'season'])
+    if team_matches_path and os.path.exists(team_matches_path):
+        saved = read_table(team_matches_path, SCHEMAS['team_matches'])
+        saved = saved[~saved['season'].isin(refresh_seasons) & saved['season'].between(start_year, end_year)]
+    reused_seasons = set(saved['season'].unique())
 
     for year in range(start_year, end_year + 1):
+        if year in reused_seasons:
+            continue
         try:
-            team_data = client.league(league).get_team_data(season=str(year))
+            team_data = load_understat_season(
+                client, league, "teams", year, store_dir, refresh=year in refresh_seasons, offline=offline
+            )
             for team_name, stats in team_data.items():
                 stats['season'] = year
                 stats['team_name'] = team_name
                 all_team_data.append(stats)
         except Exception as e:
-            print(f"❌ Failed fetching team stats for {team_name}: {e}")
+            print(f"❌ Failed fetching team stats for {league} {year}: {e}")
             sys.exit(1)
 
-    df = pd.json_normalize(all_team_data, sep="_")
+    df_team_matches = build_team_matches_table(all_team_data, df_matches) if all_team_data else saved.iloc[:0]
+    if reused_seasons:
+        print(f"Team match data for seasons {sorted(int(year) for year in reused_seasons)} taken from {team_matches_path}")
+        df_team_matches = pd.concat([saved, df_team_matches], ignore_index=True)
+        front = ['id', 'title', 'season', 'date']
+        df_team_matches = df_team_matches.sort_values(by=front, kind='stable').reset_index(drop=True)
+    if team_matches_path:
+        write_table(df_team_matches, team_matches_path, SCHEMAS['team_matches'])
+        print("Saved team match data")
+
+    team_seasons = pd.DataFrame(
+        [{'id': int(stats['id']), 'season': stats['season']} for stats in all_team_data],
+        columns=['id', 'season']
+    )
+    if reused_seasons:
+        # Taken from the fixtures rather than the saved table, which has no rows
+        # for a team whose history was empty
+        fixtures = df_matches[df_matches['season'].isin(reused_seasons)]
+        reused_teams = pd.concat([
+            fixtures[['h_id', 'season']].set_axis(['id', 'season'], axis=1),
+            fixtures[['a_id', 'season']].set_axis(['id', 'season'], axis=1),
+        ]).dropna().astype({'id': int}).drop_duplicates().sort_values(by=['season', 'id'])
+        team_seasons = pd.concat([reused_teams, team_seasons], ignore_index=True)
+    team_seasons['title'] = map_team_titles(team_seasons['id'], df_matches)
+    return summarise_team_seasons(df_team_matches, team_seasons)
 
-    # Match team IDs to home match titles to ensure correct team names.
+def map_team_titles(team_ids, df_matches):
+    """Match team IDs to home match titles to ensure correct team names."""
     id_title_map = (
         df_matches[['h_id', 'h_title']]
         .dropna()
         .drop_duplicates(subset='h_id')
         .set_index('h_id')['h_title']
-        .to_dict()
     )
+    id_title_map.index = id_title_map.index.astype(int)
+    return team_ids.astype(int).map(id_title_map)
+
+def build_team_matches_table(all_team_data: List[Dict], df_matches) -> pd.DataFrame:
+    """Flattens the per-team-season history payloads into one row per team per match."""
+    for stats in all_team_data:
+        if isinstance(stats.get('history'), str):
+            stats['history'] = ast.literal_eval(stats['history'])
 
-    df['title'] = df['id'].map(id_title_map)
-
-    # Remove JSON Columns
-    summary_rows = []
-
-    for _, row in df.iterrows():
-        team_id = row.get('id')
-        title = row.get('title')
-        season = row.get('season')
-        history = row.get('history')
-
-        if isinstance(history, str):
-            history = ast.literal_eval(history)
-
-        total_goals = sum(match.get('scored', 0) for match in history)
-        total_conceded = sum(match.get('missed', 0) for match in history)
-        total_xG = sum(match.get('xG', 0) for match in history)
-        total_xGA = sum(match.get('xGA', 0) for match in history)
-        total_pts = sum(match.get('pts', 0) for match in history)
-        total_xpts = sum(match.get('xpts', 0) for match in history)
-
-        summary_rows.append({
-            'id': team_id,
-            'title': title,
-            'season': season,
-            'goals': total_goals,
-            'conceded': total_conceded,
-            'xG': round(total_xG, 2),
-            'xGA': round(total_xGA, 2),
-            'pts': total_pts,
-            'xpts': round(total_xpts, 2)
-        })
-
-    df_summary = pd.DataFrame(summary_rows)
+    df = pd.json_normalize(all_team_data, record_path='history', meta=['id', 'season'], sep="_")
+    df['id'] = df['id'].astype(int)
+    df['title'] = map_team_titles(df['id'], df_matches)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    for col in ['scored', 'missed', 'xG', 'xGA', 'pts', 'xpts']:
+        df[col] = pd.to_numeric(df[col]).fillna(0) if col in df.columns else 0
+
+    front = [col for col in ['id', 'title', 'season', 'date'] if col in df.columns]
+    df = df[[*front, *[col for col in df.columns if col not in front]]]
+    return df.sort_values(by=front, kind='stable').reset_index(drop=True)
+
+def summarise_team_seasons(df_team_matches, team_seasons) -> pd.DataFrame:
+    """Season totals per team from the team match table; teams without matches get zeros."""
+    totals = (
+        df_team_matches
+        .groupby(['id', 'season'], sort=False)
+        .agg(
+            goals=('scored', 'sum'),
+            conceded=('missed', 'sum'),
+            xG=('xG', 'sum'),
+            xGA=('xGA', 'sum'),
+            pts=('pts', 'sum'),
+            xpts=('xpts', 'sum'),
+        )
+        .round({'xG': 2, 'xGA': 2, 'xpts': 2})
+        .reset_index()
+    )
+    df_summary = team_seasons[['id', 'title', 'season']].merge(totals, on=['id', 'season'], how='left')
+    stat_cols = ['goals', 'conceded', 'xG', 'xGA', 'pts', 'xpts']
+    df_summary[stat_cols] = df_summary[stat_cols].fillna(0)
 
     # Drop duplicates based on 'id', 'xG', and 'xGA'
     df_summary = df_summary.drop_duplicates(subset=['id', 'xG', 'xGA'])
     return df_summary
 
-def fetch_elo_data(df_summary, start_year) -> pd.DataFrame:
-    """Fetches ELO data from ClubElo API."""
-    team_list = df_summary['title'].dropna().unique().tolist()
-    print(team_list)
+CLUBELO_URL = "http://api.clubelo.com"
 
-    final_team_name_map = {
+CLUBELO_NAME_MAP = {
     'Manchester City': 'ManCity',
     'Manchester United': 'ManUnited',
     'Wolverhampton Wanderers': 'Wolves',
@@ -102,24 +234,113 @@ def fetch_elo_data(df_summary, start_year) -> pd.DataFrame:
     'Nottingham Forest': 'Forest',
     'Burnley': 'Burnley',
     'Brighton & Hove Albion': 'Brighton',
+}
+
+def clubelo_session(max_workers: int = 8, retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """Builds a pooled session that retries transient ClubElo failures with exponential backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks['response'].append(network_byte_hook)
+    return session
+
+def _read_cache(cache_dir: Optional[str], api_name: str) -> Tuple[Optional[str], Dict]:
+    if not cache_dir:
+        return None, {}
+    body_path = os.path.join(cache_dir, f"{api_name}.csv")
+    meta_path = os.path.join(cache_dir, f"{api_name}.json")
+    if not os.path.exists(body_path):
+        return None, {}
+    with open(body_path, "r") as f:
+        body = f.read()
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    return body, meta
+
+def _write_cache(cache_dir: Optional[str], api_name: str, body: str, meta: Dict) -> None:
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{api_name}.csv"), "w") as f:
+        f.write(body)
+    with open(os.path.join(cache_dir, f"{api_name}.json"), "w") as f:
+        json.dump(meta, f)
+
+def fetch_clubelo_history(session, api_name: str, base_url: str = CLUBELO_URL, cache_dir: Optional[str] = None,
+                          offline: bool = False, timeout: int = 30) -> str:
+    """
+    Returns the ClubElo CSV history for one club.
+
+    Cached histories are keyed by club and the date they were fetched or last
+    modified. A history already fetched today is reused as is; older entries
+    are revalidated with If-Modified-Since so unchanged histories are not
+    downloaded again. With offline=True only the cache directory is read,
+    which lets a directory of recorded responses stand in for the API.
+    """
+    body, meta = _read_cache(cache_dir, api_name)
+    today = date.today().isoformat()
+
+    if offline:
+        if body is None:
+            raise FileNotFoundError(f"No cached ClubElo response for {api_name} in {cache_dir}")
+        return body
+    if body is not None and meta.get("fetched") == today:
+        return body
+
+    headers = {}
+    if body is not None and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(f"{base_url.rstrip('/')}/{api_name}", headers=headers, timeout=timeout)
+    if response.status_code == 304 and body is not None:
+        meta["fetched"] = today
+        _write_cache(cache_dir, api_name, body, meta)
+        return body
+
+    response.raise_for_status()
+    _write_cache(cache_dir, api_name, response.text, {
+        "fetched": today,
+        "last_modified": response.headers.get("Last-Modified", ""),
+    })
+    return response.text
+
+@profiled
+def fetch_elo_data(df_summary, start_year, cache_dir=None, max_workers=8, base_url=CLUBELO_URL, offline=False) -> pd.DataFrame:
+    """Fetches ELO data from ClubElo API, one concurrent request per club."""
+    team_list = df_summary['title'].dropna().unique().tolist()
+    print(team_list)
+
+    api_names = {
+        team_name: CLUBELO_NAME_MAP.get(team_name, team_name.replace(" ", ""))
+        for team_name in team_list
     }
 
     clubelo_data = {}
-    for team_name in team_list:
-        print(f"Fetching ELO data for {team_name}...")
-        api_name = final_team_name_map.get(team_name, team_name.replace(" ", ""))
-        print(f"Using API name: {api_name}")
+    with clubelo_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_clubelo_history, session, api_name, base_url, cache_dir, offline): team_name
+            for team_name, api_name in api_names.items()
+        }
+        for future in as_completed(futures):
+            team_name = futures[future]
+            try:
+                clubelo_data[team_name] = pd.read_csv(StringIO(future.result()))
+                print(f"Fetched ELO data for {team_name} ({api_names[team_name]})")
+            except Exception as e:
+                print(f"[!] Error fetching ELO data for {team_name}: {e}")
+
+    # Keep the team order of df_summary regardless of completion order
+    clubelo_data = {team: clubelo_data[team] for team in team_list if team in clubelo_data}
 
-        url = f"http://api.clubelo.com/{api_name}"
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            df = pd.read_csv(StringIO(response.text))
-            clubelo_data[team_name] = df
-        except Exception as e:
-            print(f"[!] Error fetching ELO data for {team_name}: {e}")
-            continue
-    
     if clubelo_data:
         all_data_df = pd.concat(
             clubelo_data.values(),
@@ -132,17 +353,115 @@ def fetch_elo_data(df_summary, start_year) -> pd.DataFrame:
         all_data_df = all_data_df[all_data_df['To'].dt.year >= start_year]
     return all_data_df
 
-def run_data_load(client, start_year, end_year, league, raw_match_data_path, raw_elo_data_path):
-    df_matches = fetch_match_data(client,start_year, end_year, league)
+def fetch_elo_snapshot(session, day: date, base_url: str = CLUBELO_URL, cache_dir: Optional[str] = None,
+                       offline: bool = False) -> pd.DataFrame:
+    """Every club's ClubElo interval on one day: a single request, cached like a club history."""
+    return pd.read_csv(StringIO(fetch_clubelo_history(session, day.isoformat(), base_url, cache_dir, offline)))
+
+@profiled
+def update_elo_timeline(df_summary, start_year, timeline_path, seed_path=None, cache_dir=None, max_workers=8,
+                        base_url=CLUBELO_URL, offline=False, today=None, max_snapshots=120):
+    """
+    Brings the Elo timeline at timeline_path up to today and returns it.
+
+    A new timeline is seeded from the ClubElo table at seed_path if there is
+    one, else from full club histories; a team not yet in the timeline (e.g.
+    promoted) has its history fetched once. After that, one date snapshot
+    covers every club: starting from the last day applied, each snapshot's
+    intervals say when the next rating change happened, so a week's update
+    costs a request per matchday rather than one per club.
+    """
+    from scripts.elo_timeline import EloTimeline, from_days
+
+    today = today or date.today()
+    timeline = EloTimeline.load(timeline_path) if os.path.exists(timeline_path) else None
+    if timeline is None and seed_path and os.path.exists(seed_path):
+        timeline = EloTimeline.from_intervals(read_table(seed_path, SCHEMAS['elo']))
+        print(f"Seeded Elo timeline from {seed_path}")
+
+    team_list = df_summary['title'].dropna().unique()
+    missing = team_list if timeline is None else team_list[~pd.Series(team_list).isin(timeline.titles).to_numpy()]
+    if len(missing):
+        histories = fetch_elo_data(
+            df_summary[df_summary['title'].isin(missing)], start_year, cache_dir=cache_dir,
+            max_workers=max_workers, base_url=base_url, offline=offline
+        )
+        fetched = EloTimeline.from_intervals(histories)
+        timeline = fetched if timeline is None else timeline.add_teams(fetched)
+
+    snapshots, changed = 0, set()
+    day = from_days(timeline.updated_through).item()
+    with clubelo_session(max_workers) as session:
+        while day <= today and snapshots < max_snapshots:
+            try:
+                snapshot = fetch_elo_snapshot(session, day, base_url, cache_dir, offline)
+            except Exception as e:
+                print(f"⚠️ No ClubElo snapshot for {day}: {e}")
+                break
+            timeline, titles = timeline.apply_snapshot(snapshot, (day - date(1970, 1, 1)).days)
+            changed.update(titles)
+            snapshots += 1
+
+            # The next change is the day after the earliest tracked interval ends
+            tracked = snapshot[snapshot['Club'].isin(timeline.clubs)]
+            ends = pd.to_datetime(tracked['To'], errors='coerce').dropna()
+            if ends.empty:
+                break
+            day = max(ends.min().date(), day) + timedelta(days=1)
+
+    timeline.save(timeline_path)
+    print(f"Elo timeline: {snapshots} snapshots, {len(changed)} teams updated, {len(timeline)} intervals "
+          f"({timeline.nbytes / 1e6:.2f} MB) through {from_days(timeline.updated_through)}")
+    return timeline
+
+def hook_understat_session(client) -> bool:
+    """
+    Counts the Understat client's response bytes against the running stage.
+    understatapi makes its requests through client.session; returns False if
+    the client has no requests session to hook.
+    """
+    session = getattr(client, 'session', None)
+    if not isinstance(session, requests.Session):
+        return False
+    if network_byte_hook not in session.hooks['response']:
+        session.hooks['response'].append(network_byte_hook)
+    return True
+
+def run_data_load(client, start_year, end_year, league, raw_match_data_path, raw_elo_data_path,
+                  elo_cache_dir=None, elo_max_workers=8, understat_store_dir=None, offline=False,
+                  raw_team_matches_path=None, elo_timeline_path=None, close_after_days=None):
+    # Decide once, so team data follows the same seasons as match data
+    refresh_seasons = open_seasons(understat_store_dir, league, start_year, end_year, close_after_days)
+    if understat_store_dir and not offline:
+        print(f"Refreshing Understat seasons: {sorted(refresh_seasons)}")
+    if not offline and not hook_understat_session(client):
+        print("⚠️  Understat client has no requests session; its network bytes are not counted")
+
+    df_matches = fetch_match_data(
+        client, start_year, end_year, league, understat_store_dir, refresh_seasons, offline
+    )
     df_matches = df_matches[df_matches['isResult'] == True].reset_index(drop=True)
-    df_matches.to_csv(raw_match_data_path, index=False)
+    write_table(df_matches, raw_match_data_path, SCHEMAS['matches'])
     print("Saved match data")
 
-    df_summary = fetch_team_data(df_matches, client, start_year, end_year, league)
+    df_summary = fetch_team_data(
+        df_matches, client, start_year, end_year, league, understat_store_dir, refresh_seasons, offline,
+        team_matches_path=raw_team_matches_path
+    )
     print("Team summary ready")
 
-    df_elo = fetch_elo_data(df_summary, start_year)
-    df_elo.to_csv(raw_elo_data_path, index=False)
+    if elo_timeline_path:
+        # raw_elo_data_path only seeds a new timeline
+        df_elo = update_elo_timeline(
+            df_summary, start_year, elo_timeline_path, seed_path=raw_elo_data_path, cache_dir=elo_cache_dir,
+            max_workers=elo_max_workers, offline=offline
+        )
+        return df_matches, df_elo
+
+    df_elo = fetch_elo_data(
+        df_summary, start_year, cache_dir=elo_cache_dir, max_workers=elo_max_workers, offline=offline
+    )
+    write_table(df_elo, raw_elo_data_path, SCHEMAS['elo'])
     print("Saved ELO data")
 
     return df_matches, df_elo
@@ -0,0 +1,159 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Every team's ClubElo history as flat arrays: interval starts and inclusive
+# ends as int32 days since 1970-01-01 and ratings as float32 (ClubElo
+# publishes float32 values to 8 places, so nothing is lost). Team t's
+# intervals are rows offsets[t]:offsets[t + 1], sorted by start, so one
+# binary search over (team, start) finds the rating for any (team, date).
+# The timeline is kept current from ClubElo date snapshots, one request
+# returning every club's rating on that day.
+
+EPOCH_SHIFT = 2 ** 31  # starts go back before 1970; keeps search keys non-negative
+
+def to_days(dates):
+    """int32 days since 1970-01-01; times of day are dropped."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int32)
+
+def from_days(days):
+    return np.asarray(days).astype('datetime64[D]')
+
+class EloTimeline:
+    """
+    Per-team Elo intervals in array-backed segments. titles are the team names
+    used in the trainset and clubs their ClubElo names, which date snapshots
+    are matched on. updated_through is the last day a snapshot was applied.
+    """
+
+    def __init__(self, titles, clubs, offsets, starts, ends, elo, updated_through):
+        self.titles = np.asarray(titles, dtype=str)
+        self.clubs = np.asarray(clubs, dtype=str)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        self.elo = np.asarray(elo, dtype=np.float32)
+        self.updated_through = int(updated_through)
+        self.team_ids = {title: i for i, title in enumerate(self.titles)}
+        team = np.repeat(np.arange(len(self.titles), dtype=np.int64), np.diff(self.offsets))
+        self._keys = (team << 32) + self.starts + EPOCH_SHIFT
+
+    @classmethod
+    def from_intervals(cls, elo_data, updated_through=None):
+        """
+        Builds a timeline from ClubElo history rows (title, Club, Elo, From, To),
+        as fetch_elo_data returns them. updated_through defaults to the latest
+        interval start, so the next update re-reads from there.
+        """
+        elo_data = elo_data.dropna(subset=['title', 'Elo', 'From', 'To'])
+        codes, titles = pd.factorize(elo_data['title'], sort=True)
+        starts, ends = to_days(elo_data['From']), to_days(elo_data['To'])
+        order = np.lexsort((starts, codes))
+        counts = np.bincount(codes, minlength=len(titles))
+        clubs = elo_data.groupby(codes)['Club'].last() if 'Club' in elo_data else pd.Series(titles)
+        return cls(
+            titles, clubs.to_numpy(dtype=str), np.concatenate([[0], np.cumsum(counts)]),
+            starts[order], ends[order], elo_data['Elo'].to_numpy(dtype=np.float32)[order],
+            starts.max() if updated_through is None else updated_through,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, titles=self.titles, clubs=self.clubs, offsets=self.offsets, starts=self.starts,
+                     ends=self.ends, elo=self.elo, updated_through=self.updated_through)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def nbytes(self):
+        arrays = [self.titles, self.clubs, self.offsets, self.starts, self.ends, self.elo, self._keys]
+        return sum(array.nbytes for array in arrays)
+
+    def lookup(self, titles, dates):
+        """
+        The Elo in force for each (title, date) pair, as float64 rounded to the
+        8 places ClubElo publishes. Unknown teams and dates outside every
+        interval come back as NaN.
+        """
+        titles = pd.Series(titles).reset_index(drop=True)
+        team = titles.map(self.team_ids).to_numpy(dtype=float)
+        known = ~np.isnan(team)
+        team = np.where(known, team, 0).astype(np.int64)
+        days = to_days(dates)
+
+        i = np.searchsorted(self._keys, (team << 32) + days + EPOCH_SHIFT, side='right') - 1
+        i_clipped = np.clip(i, 0, None)
+        found = known & (i >= self.offsets[team]) & (days <= self.ends[i_clipped])
+        return np.where(found, np.round(self.elo[i_clipped].astype(np.float64), 8), np.nan)
+
+    def to_frame(self):
+        """The intervals as a ClubElo-style table (title, Club, Elo, From, To)."""
+        team = np.repeat(np.arange(len(self.titles)), np.diff(self.offsets))
+        return pd.DataFrame({
+            'title': self.titles[team],
+            'Club': self.clubs[team],
+            'Elo': np.round(self.elo.astype(np.float64), 8),
+            'From': from_days(self.starts),
+            'To': from_days(self.ends),
+        })
+
+    def add_teams(self, other):
+        """A timeline with other's teams added; teams already present keep their own history."""
+        new = ~np.isin(other.titles, self.titles)
+        if not new.any():
+            return self
+        added = other.to_frame()
+        combined = pd.concat([self.to_frame(), added[added['title'].isin(other.titles[new])]])
+        return EloTimeline.from_intervals(combined, min(self.updated_through, other.updated_through))
+
+    def apply_snapshot(self, snapshot, day):
+        """
+        Returns the timeline with a ClubElo date snapshot (Club, Elo, From, To,
+        one row per club) applied. A tracked club's snapshot interval replaces
+        every interval starting on or after its start, and an earlier interval
+        running into it is cut short. Also returns the titles that changed.
+        """
+        day = int(day)
+        snapshot = snapshot.dropna(subset=['Club', 'Elo', 'From', 'To']).drop_duplicates(subset=['Club'], keep='last')
+        club_team = {club: i for i, club in enumerate(self.clubs)}
+        team = snapshot['Club'].map(club_team)
+        snapshot = snapshot[team.notna()]
+        team = team[team.notna()].to_numpy(dtype=np.int64)
+        new_starts, new_ends = to_days(snapshot['From']), to_days(snapshot['To'])
+        new_elo = snapshot['Elo'].to_numpy(dtype=np.float32)
+
+        # Skip clubs whose latest interval the snapshot already matches
+        last = self.offsets[team + 1] - 1
+        has_last = last >= self.offsets[team]
+        last = np.clip(last, 0, None)
+        unchanged = has_last & (self.starts[last] == new_starts) & (self.ends[last] == new_ends) & (self.elo[last] == new_elo)
+        team, new_starts, new_ends, new_elo = team[~unchanged], new_starts[~unchanged], new_ends[~unchanged], new_elo[~unchanged]
+        if not len(team):
+            return EloTimeline(self.titles, self.clubs, self.offsets, self.starts, self.ends, self.elo,
+                               max(self.updated_through, day)), []
+
+        row_team = np.repeat(np.arange(len(self.titles)), np.diff(self.offsets))
+        cut_from = np.full(len(self.titles), np.iinfo(np.int32).max, dtype=np.int64)
+        cut_from[team] = new_starts
+        keep = self.starts < cut_from[row_team]
+        ends = np.minimum(self.ends, cut_from[row_team] - 1)[keep]
+
+        teams = np.concatenate([row_team[keep], team])
+        starts = np.concatenate([self.starts[keep], new_starts])
+        order = np.lexsort((starts, teams))
+        counts = np.bincount(teams, minlength=len(self.titles))
+        timeline = EloTimeline(
+            self.titles, self.clubs, np.concatenate([[0], np.cumsum(counts)]), starts[order],
+            np.concatenate([ends, new_ends])[order], np.concatenate([self.elo[keep], new_elo])[order],
+            max(self.updated_through, day),
+        )
+        return timeline, self.titles[team].tolist()
@@ -1,4 +1,7 @@
+import numpy as np
 import pandas as pd
+from scripts.storage import SCHEMAS, write_table
+from scripts.profiling import profiled
 
 def engineer_stat_diff(df: pd.DataFrame) -> pd.DataFrame:
     df['elo_diff'] = round(df['h_elo'] - df['a_elo'], 3)
@@ -6,105 +9,155 @@ def engineer_stat_diff(df: pd.DataFrame) -> pd.DataFrame:
     df['age_diff'] = round(df['avg_age_h'] - df['avg_age_a'], 3)
     return df
 
-def generate_h2h_features(matches_df, n=5):
-    matches_df = matches_df.sort_values(by='datetime')
-    h2h_data = []
-
-    for idx, row in matches_df.iterrows():
-        h_id, a_id, match_date = row['h_id'], row['a_id'], row['datetime']
-
-        # Find past H2H matches before current match
-        past_matches = matches_df[
-            (((matches_df['h_id'] == h_id) & (matches_df['a_id'] == a_id)) |
-             ((matches_df['h_id'] == a_id) & (matches_df['a_id'] == h_id))) &
-            (matches_df['datetime'] < match_date)
-        ].sort_values(by='datetime', ascending=False).head(n)
-
-        # Initialize features
-        h_wins, a_wins, draws, goal_diff_sum = 0, 0, 0, 0
-
-        for _, past in past_matches.iterrows():
-            home = past['h_id']
-            away = past['a_id']
-            gh = past['goals_h']
-            ga = past['goals_a']
+def build_h2h_index(matches_df):
+    """Groups match history by unordered team pair, each pair's matches in date order."""
+    matches_df = matches_df.sort_values(by='datetime', kind='stable')
+    dates = pd.to_datetime(matches_df['datetime']).to_numpy()
+    h_ids = matches_df['h_id'].to_numpy()
+    a_ids = matches_df['a_id'].to_numpy()
+    goals_h = matches_df['goals_h'].to_numpy(dtype=float)
+    goals_a = matches_df['goals_a'].to_numpy(dtype=float)
+
+    pair_keys = [np.minimum(h_ids, a_ids), np.maximum(h_ids, a_ids)]
+    h2h_index = {}
+    for (team_1, team_2), positions in matches_df.groupby(pair_keys, sort=False).indices.items():
+        h2h_index[(int(team_1), int(team_2))] = {
+            'datetime': dates[positions],
+            'h_id': h_ids[positions].tolist(),
+            'goals_h': goals_h[positions].tolist(),
+            'goals_a': goals_a[positions].tolist(),
+        }
+    return h2h_index
+
+def h2h_features(h2h_index, h_id, a_id, match_date, n=5):
+    """Summarises the last n meetings of two teams before match_date, from h_id's point of view."""
+    history = h2h_index.get((min(h_id, a_id), max(h_id, a_id)))
+    h_wins, a_wins, draws, goal_diff_sum = 0, 0, 0, 0
+    played = 0
+
+    if history is not None:
+        end = np.searchsorted(history['datetime'], pd.Timestamp(match_date).to_datetime64(), side='left')
+        played = min(n, end)
+
+        # Most recent meeting first
+        for i in range(end - 1, end - 1 - played, -1):
+            gh = history['goals_h'][i]
+            ga = history['goals_a'][i]
+            h_was_home = history['h_id'][i] == h_id
 
             if gh > ga:
-                winner = 'H'
+                winner_is_h = h_was_home
             elif gh < ga:
-                winner = 'A'
+                winner_is_h = not h_was_home
             else:
-                winner = 'D'
+                winner_is_h = None
 
-            if winner == 'H' and home == h_id:
-                h_wins += 1
-            elif winner == 'A' and away == h_id:
+            if winner_is_h is None:
+                draws += 1
+            elif winner_is_h:
                 h_wins += 1
-            elif winner == 'H' and home == a_id:
-                a_wins += 1
-            elif winner == 'A' and away == a_id:
-                a_wins += 1
             else:
-                draws += 1
+                a_wins += 1
+
+            goal_diff_sum += (gh - ga) if h_was_home else (ga - gh)
 
-            goal_diff = (gh - ga) if home == h_id else (ga - gh)
-            goal_diff_sum += goal_diff
+    return {
+        'h2h_home_wins': h_wins,
+        'h2h_away_wins': a_wins,
+        'h2h_draws': draws,
+        'h2h_goal_diff_avg': round(goal_diff_sum / max(1, played), 3),
+        'h2h_matches_played': played
+    }
 
-        h2h_data.append({
-            'h2h_home_wins': h_wins,
-            'h2h_away_wins': a_wins,
-            'h2h_draws': draws,
-            'h2h_goal_diff_avg': round(goal_diff_sum / max(1, len(past_matches)), 3),
-            'h2h_matches_played': len(past_matches)
-        })
+@profiled
+def generate_h2h_features(matches_df, n=5, h2h_index=None):
+    matches_df = matches_df.sort_values(by='datetime', kind='stable')
+    if h2h_index is None:
+        h2h_index = build_h2h_index(matches_df)
+
+    h2h_data = [
+        h2h_features(h2h_index, h_id, a_id, match_date, n)
+        for h_id, a_id, match_date in zip(matches_df['h_id'], matches_df['a_id'], matches_df['datetime'])
+    ]
 
     h2h_df = pd.DataFrame(h2h_data)
     return pd.concat([matches_df.reset_index(drop=True), h2h_df], axis=1)
 
+def build_team_matches(df):
+    """Reshapes matches into one row per team per match, ordered by team and date."""
+    match_idx = np.arange(len(df))
+    sides = []
+    for side, team_col, gf, ga, xgf, xga in [
+        ('h', 'h_id', 'goals_h', 'goals_a', 'xG_h', 'xG_a'),
+        ('a', 'a_id', 'goals_a', 'goals_h', 'xG_a', 'xG_h'),
+    ]:
+        sides.append(pd.DataFrame({
+            'match_idx': match_idx,
+            'side': side,
+            'team_id': df[team_col].to_numpy(),
+            'datetime': df['datetime'].to_numpy(),
+            'goals_for': df[gf].to_numpy(dtype=float),
+            'goals_against': df[ga].to_numpy(dtype=float),
+            'xg_for': df[xgf].to_numpy(dtype=float),
+            'xg_against': df[xga].to_numpy(dtype=float),
+        }))
+
+    team_matches = pd.concat(sides, ignore_index=True)
+    result = team_matches['goals_for'] - team_matches['goals_against']
+    team_matches['points'] = np.select([result > 0, result == 0], [3, 1], default=0)
+
+    return team_matches.sort_values(by=['team_id', 'datetime'], kind='stable').reset_index(drop=True)
+
+def _round_half_even(values, ndigits):
+    # Python's round() works on the exact decimal value, Series.round() does not
+    return pd.Series([round(v, ndigits) for v in values.tolist()], index=values.index, dtype=float)
+
+def team_form(team_matches, n=5):
+    """Sums each team's previous n matches in a single grouped pass over build_team_matches output."""
+    grouped = team_matches.groupby('team_id', sort=False)
+    stat_cols = ['points', 'goals_for', 'goals_against', 'xg_for', 'xg_against']
+    present = pd.Series(True, index=team_matches.index)
+    totals = pd.DataFrame(0.0, index=team_matches.index, columns=stat_cols)
+    totals['points'] = 0
+    played = pd.Series(0, index=team_matches.index)
+
+    # Most recent match first, matching the order of the old per-row loop
+    for k in range(1, n + 1):
+        exists = present.groupby(team_matches['team_id'], sort=False).shift(k, fill_value=False)
+        shifted = grouped[stat_cols].shift(k)
+        totals = totals + shifted.where(exists, 0)
+        played += exists.astype(int)
+
+    games = played.clip(lower=1)
+    return pd.DataFrame({
+        'match_idx': team_matches['match_idx'],
+        'side': team_matches['side'],
+        'form_points': totals['points'].astype(int),
+        'form_goals_scored': totals['goals_for'],
+        'form_goals_conceded': totals['goals_against'],
+        'form_xg': _round_half_even(totals['xg_for'] / games, 3),
+        'form_xga': _round_half_even(totals['xg_against'] / games, 3),
+    })
+
+def _form_columns(form, team_side, n_matches, prefix=None):
+    prefix = prefix or team_side
+    side_form = form[form['side'] == team_side].set_index('match_idx').reindex(np.arange(n_matches))
+    side_form = side_form.drop(columns=['side'])
+    return side_form.rename(columns={col: f'{prefix}_{col}' for col in side_form.columns}).reset_index(drop=True)
+
+@profiled
 def compute_recent_form(df, team_col, side='h', n=5):
-    df = df.sort_values(by='datetime')
-    form_stats = []
-
-    for idx, row in df.iterrows():
-        team_id = row[team_col]
-        match_date = row['datetime']
-
-        # Filter past matches involving this team
-        past_matches = df[
-            (((df['h_id'] == team_id) | (df['a_id'] == team_id)) &
-             (df['datetime'] < match_date))
-        ].sort_values(by='datetime', ascending=False).head(n)
-
-        points = goals_scored = goals_conceded = xg_for = xg_against = 0
-
-        for _, match in past_matches.iterrows():
-            if match['h_id'] == team_id:
-                goals_scored += match['goals_h']
-                goals_conceded += match['goals_a']
-                xg_for += match['xG_h']
-                xg_against += match['xG_a']
-                result = match['goals_h'] - match['goals_a']
-            else:
-                goals_scored += match['goals_a']
-                goals_conceded += match['goals_h']
-                xg_for += match['xG_a']
-                xg_against += match['xG_h']
-                result = match['goals_a'] - match['goals_h']
-
-            if result > 0:
-                points += 3
-            elif result == 0:
-                points += 1
-
-        form_stats.append({
-            f'{side}_form_points': points,
-            f'{side}_form_goals_scored': goals_scored,
-            f'{side}_form_goals_conceded': goals_conceded,
-            f'{side}_form_xg': round(xg_for / max(1, len(past_matches)), 3),
-            f'{side}_form_xga': round(xg_against / max(1, len(past_matches)), 3)
-        })
-
-    return pd.concat([df.reset_index(drop=True), pd.DataFrame(form_stats)], axis=1)
+    df = df.sort_values(by='datetime', kind='stable').reset_index(drop=True)
+    team_side = 'h' if team_col == 'h_id' else 'a'
+    form = team_form(build_team_matches(df), n)
+    return pd.concat([df, _form_columns(form, team_side, len(df), side)], axis=1)
+
+@profiled
+def add_recent_form(df, n=5):
+    """Adds h_form_* and a_form_* columns from one pass over the team-match table."""
+    df = df.sort_values(by='datetime', kind='stable').reset_index(drop=True)
+    form = team_form(build_team_matches(df), n)
+    return pd.concat([df, _form_columns(form, 'h', len(df)), _form_columns(form, 'a', len(df))], axis=1)
 
 def clean_trainset(df: pd.DataFrame) -> pd.DataFrame:
     df = df.drop(columns=['h_id', 'a_id', 'goals_h', 'goals_a', 'xG_h', 
@@ -114,12 +167,16 @@ def clean_trainset(df: pd.DataFrame) -> pd.DataFrame:
     df = df.fillna(0)    
     return df
 
-def engineer_features(trainset, final_trainset_path):
+def build_features(trainset, n=5):
+    """Row-level, H2H and form features; matches sharing a datetime keep their order in trainset."""
     trainset = engineer_stat_diff(trainset)
-    trainset = generate_h2h_features(trainset)
-    trainset = compute_recent_form(trainset, 'h_id', 'h')
-    trainset = compute_recent_form(trainset, 'a_id', 'a')
+    trainset = generate_h2h_features(trainset, n)
+    trainset = add_recent_form(trainset, n)
+    return trainset
+
+def engineer_features(trainset, final_trainset_path):
+    trainset = build_features(trainset)
     trainset = clean_trainset(trainset)
-    trainset.to_csv(final_trainset_path, index=False)
+    write_table(trainset, final_trainset_path, SCHEMAS['trainset'])
     print(f"Final trainset saved")
     return trainset
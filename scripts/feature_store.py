@@ -0,0 +1,158 @@
+import os
+import pandas as pd
+from scripts.storage import SCHEMAS, read_table, write_table
+from scripts.feature_engineering import (
+    build_features,
+    build_h2h_index,
+    build_team_matches,
+    clean_trainset,
+    engineer_stat_diff,
+    generate_h2h_features,
+    add_recent_form,
+)
+
+KEY_COLS = ['season', 'gw', 'h_id', 'a_id']
+# Inputs that form and H2H features of later matches depend on
+HISTORY_COLS = ['datetime', 'h_id', 'a_id', 'goals_h', 'goals_a', 'xG_h', 'xG_a']
+
+def load_feature_store(store_path):
+    if not os.path.exists(store_path):
+        return None
+    store = read_table(store_path, SCHEMAS['trainset'])
+    store['datetime'] = pd.to_datetime(store['datetime'])
+    return store
+
+def save_feature_store(store, store_path):
+    write_table(store, store_path, SCHEMAS['trainset'])
+
+def _row_hashes(df, cols):
+    """Hashes each row of cols after normalising the dtype drift of a CSV round trip."""
+    normalized = pd.DataFrame(index=df.index)
+    for col in cols:
+        if col == 'datetime':
+            normalized[col] = pd.to_datetime(df[col])
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            normalized[col] = df[col].astype(float)
+        else:
+            normalized[col] = df[col].astype(str)
+    return pd.util.hash_pandas_object(normalized, index=False)
+
+def _keyed(df):
+    return df.set_index(KEY_COLS, drop=False)
+
+def _history_window(current, since, n):
+    """Rows from `since` on, plus each team's last n matches before it (the rolling-form state)."""
+    team_matches = build_team_matches(current)
+    before = team_matches[team_matches['datetime'] < since]
+    state_idx = before.groupby('team_id', sort=False).tail(n)['match_idx'].unique()
+    positions = sorted(set(state_idx) | set(current.index[current['datetime'] >= since]))
+    return current.iloc[positions]
+
+def diff_feature_store(store, current):
+    """
+    Compares a stored feature table against a freshly merged trainset.
+
+    Returns (local_keys, since): keys whose row-level inputs changed but whose
+    history is intact, and the earliest date from which form and H2H features
+    have to be recomputed (None when the match history is unchanged).
+    """
+    input_cols = list(current.columns)
+    old = _keyed(store)
+    new = _keyed(current)
+
+    added = new.index.difference(old.index)
+    removed = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+
+    old_common = old.loc[common]
+    new_common = new.loc[common]
+    input_changed = _row_hashes(old_common, input_cols).to_numpy() != _row_hashes(new_common, input_cols).to_numpy()
+    history_changed = _row_hashes(old_common, HISTORY_COLS).to_numpy() != _row_hashes(new_common, HISTORY_COLS).to_numpy()
+
+    changed_dates = pd.concat([
+        new.loc[added, 'datetime'],
+        old.loc[removed, 'datetime'],
+        old_common.loc[history_changed, 'datetime'],
+        new_common.loc[history_changed, 'datetime'],
+    ])
+    since = changed_dates.min() if len(changed_dates) else None
+
+    local_keys = common[input_changed & ~history_changed]
+    return local_keys, since
+
+def update_feature_store(merged_trainset, store_path, n=5):
+    """
+    Brings the feature store in line with merged_trainset and returns the full feature table.
+
+    Rows are keyed by (season, gw, h_id, a_id). Only rows whose inputs changed
+    get their row-level features recomputed; form and H2H features are
+    recomputed from the earliest changed match onwards, which for a normal
+    week is just the newly added gameweek.
+    """
+    current = merged_trainset.copy().reset_index(drop=True)
+    current['datetime'] = pd.to_datetime(current['datetime'])
+    store = load_feature_store(store_path)
+
+    if (store is None
+            or not set(current.columns) <= set(store.columns)
+            or current.duplicated(subset=KEY_COLS).any()):
+        print("Feature store missing or incompatible, rebuilding in full")
+        features = build_features(current, n)
+        save_feature_store(features, store_path)
+        return features
+
+    feature_cols = [col for col in store.columns if col not in current.columns]
+    local_keys, since = diff_feature_store(store, current)
+    keyed_current = _keyed(current)
+    stored = _keyed(store)
+
+    recomputed = current.iloc[0:0]
+    if since is not None:
+        window = _history_window(current, since, n)
+        window = engineer_stat_diff(window.copy())
+        window = generate_h2h_features(window, n, build_h2h_index(current))
+        window = add_recent_form(window, n)
+        recomputed = window[window['datetime'] >= since]
+        local_keys = local_keys[keyed_current.loc[local_keys, 'datetime'] < since]
+
+    # Rows that only need their row-level stats refreshed (e.g. an Elo correction)
+    local = stored.loc[local_keys].copy()
+    local[current.columns] = keyed_current.loc[local_keys, current.columns]
+    local = engineer_stat_diff(local)
+
+    stored = stored[stored.index.isin(keyed_current.index) & ~stored.index.isin(local_keys)]
+    if since is not None:
+        stored = stored[stored['datetime'] < since]
+
+    print(f"Feature store: {len(local)} rows refreshed, {len(recomputed)} rows recomputed"
+          f"{f' from {since:%Y-%m-%d}' if since is not None else ''}")
+
+    # An empty part lacks the feature columns and would upcast the integer ones to float
+    parts = [part.reset_index(drop=True) for part in (stored, local, recomputed) if len(part)]
+    features = pd.concat(parts, ignore_index=True)
+    features = features[[*current.columns, *feature_cols]]
+    # Same row order as a full rebuild: merged trainset order, stably sorted by datetime
+    order = _keyed(current.sort_values(by='datetime', kind='stable')).index
+    features = _keyed(features).loc[order].reset_index(drop=True)
+    save_feature_store(features, store_path)
+    return features
+
+def verify_feature_store(features, merged_trainset, n=5):
+    """Checks an incrementally maintained feature table against a full rebuild."""
+    full = build_features(merged_trainset.copy(), n)
+    full['datetime'] = pd.to_datetime(full['datetime'])
+
+    try:
+        pd.testing.assert_frame_equal(full, features[full.columns], check_dtype=False, check_exact=True)
+    except AssertionError as e:
+        raise ValueError(f"Feature store diverged from a full rebuild: {e}")
+    print("Feature store matches full rebuild")
+
+def engineer_features_incremental(merged_trainset, final_trainset_path, feature_store_path, verify=False):
+    features = update_feature_store(merged_trainset, feature_store_path)
+    if verify:
+        verify_feature_store(features, merged_trainset)
+    trainset = clean_trainset(features)
+    write_table(trainset, final_trainset_path, SCHEMAS['trainset'])
+    print(f"Final trainset saved")
+    return trainset
@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder
+
+MODEL_FILE = 'model.ubj'
+META_FILE = 'meta.json'
+
+# Loaded versions, keyed by path and file version, so repeat loads are free
+_loaded = {}
+
+class RegisteredModel:
+    """
+    A registered booster with its feature list, label order and metadata.
+
+    predict_proba and predict mirror XGBClassifier, and le is a LabelEncoder
+    with the stored label order, so it drops into predict_gw and score_fixtures.
+    """
+
+    def __init__(self, booster, meta):
+        self.booster = booster
+        self.meta = meta
+        self.feature_cols = meta['feature_cols']
+        self.le = LabelEncoder()
+        self.le.classes_ = np.array(meta['labels'], dtype=object)
+        self.n_features_in_ = len(self.feature_cols)
+
+    @property
+    def version(self):
+        return version_name(self.meta['season'], self.meta['gw'])
+
+    def predict_proba(self, X):
+        X = X[self.feature_cols] if isinstance(X, pd.DataFrame) else X
+        return self.booster.inplace_predict(X)
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)
+
+def version_name(season, gw):
+    return f"{int(season)}_gw{int(gw):02d}"
+
+def version_dir(registry_dir, season, gw):
+    return os.path.join(registry_dir, version_name(season, gw))
+
+def register_model(model, le, feature_cols, registry_dir, season, gw, metadata=None):
+    """
+    Saves the model trained to predict (season, gw) under registry_dir/{season}_gw{gw}.
+
+    The booster goes in XGBoost's native binary format with a meta.json holding
+    the feature list, label order, parameters and any training metadata. A
+    version is written to a temporary directory and moved into place, so a
+    reader never sees half of one; registering the same gameweek again replaces it.
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    meta = {
+        'season': int(season),
+        'gw': int(gw),
+        'feature_cols': list(feature_cols),
+        'labels': [str(label) for label in le.classes_],
+        'params': {k: v for k, v in model.get_params().items() if v is not None} if hasattr(model, 'get_params') else {},
+        'xgboost_version': xgb.__version__,
+        'registered_at': datetime.now().isoformat(timespec='seconds'),
+        **(metadata or {}),
+    }
+
+    os.makedirs(registry_dir, exist_ok=True)
+    target = version_dir(registry_dir, season, gw)
+    staging = tempfile.mkdtemp(dir=registry_dir, prefix='.staging_')
+    booster.save_model(os.path.join(staging, MODEL_FILE))
+    with open(os.path.join(staging, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    print(f"Model registered as {version_name(season, gw)} in {registry_dir}")
+    return target
+
+def list_models(registry_dir):
+    """One row per registered version, oldest first, with its training metadata."""
+    rows = []
+    if os.path.isdir(registry_dir):
+        for name in os.listdir(registry_dir):
+            meta_path = os.path.join(registry_dir, name, META_FILE)
+            if not name.startswith('.') and os.path.exists(meta_path):
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                rows.append({
+                    'version': name,
+                    'n_features': len(meta['feature_cols']),
+                    **{k: v for k, v in meta.items() if not isinstance(v, (list, dict))},
+                })
+    if not rows:
+        return pd.DataFrame(columns=['version', 'season', 'gw'])
+    return pd.DataFrame(rows).sort_values(by=['season', 'gw']).reset_index(drop=True)
+
+def load_model(registry_dir, season, gw):
+    """Loads the model registered for (season, gw). Repeat loads of an unchanged version come from memory."""
+    path = version_dir(registry_dir, season, gw)
+    model_path = os.path.join(path, MODEL_FILE)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"No model registered for season {season} gw {gw} in {registry_dir}")
+
+    key = (os.path.abspath(path), os.stat(model_path).st_mtime_ns)
+    if key not in _loaded:
+        with open(os.path.join(path, META_FILE), 'r') as f:
+            meta = json.load(f)
+        booster = xgb.Booster()
+        booster.load_model(model_path)
+        booster.feature_names = meta['feature_cols']
+        _loaded[key] = RegisteredModel(booster, meta)
+    return _loaded[key]
+
+def model_in_use(registry_dir, season, gw, include_current=True):
+    """
+    The model that was live for (season, gw): the one registered for it, else
+    the latest registered before it. include_current=False skips (season, gw) itself.
+    """
+    versions = list_models(registry_dir)
+    if include_current:
+        earlier = (versions['season'] < season) | ((versions['season'] == season) & (versions['gw'] <= gw))
+    else:
+        earlier = (versions['season'] < season) | ((versions['season'] == season) & (versions['gw'] < gw))
+    if not earlier.any():
+        raise FileNotFoundError(f"No model registered before season {season} gw {gw} in {registry_dir}")
+    latest = versions[earlier].iloc[-1]
+    return load_model(registry_dir, latest['season'], latest['gw'])
+
+def compare_models(registry_dir, versions, trainset=None):
+    """
+    Compares registered versions, given as (season, gw) pairs.
+
+    Returns one row per version with its metadata and the features it gained
+    or lost against the first. With trainset (feature rows, e.g. a gameweek of
+    the final trainset), also the mean absolute probability difference from
+    the first version and how often the two pick the same outcome.
+    """
+    models = [load_model(registry_dir, season, gw) for season, gw in versions]
+    base = models[0]
+    if trainset is not None:
+        base_proba = base.predict_proba(trainset)
+
+    rows = []
+    for model in models:
+        row = {
+            'version': model.version,
+            'n_features': len(model.feature_cols),
+            'features_added': sorted(set(model.feature_cols) - set(base.feature_cols)),
+            'features_removed': sorted(set(base.feature_cols) - set(model.feature_cols)),
+            **{k: v for k, v in model.meta.items() if not isinstance(v, (list, dict))},
+        }
+        if trainset is not None:
+            proba = model.predict_proba(trainset)
+            # Align outcome columns by label in case label order differs
+            proba = proba[:, [list(model.le.classes_).index(label) for label in base.le.classes_]]
+            row['mean_abs_proba_diff'] = round(float(np.abs(proba - base_proba).mean()), 4)
+            row['pick_agreement'] = round(float((proba.argmax(axis=1) == base_proba.argmax(axis=1)).mean()), 4)
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+from scripts.storage import read_table
+
+# Bookmaker prices, one row per fixture per bookmaker:
+#   season, gw, h_title, a_title, bookmaker, book_odds_h, book_odds_d, book_odds_a
+# Prices may be fractional ('5/2', 'evens'), decimal ('3.5') or American
+# ('+150', '-200'), mixed freely.
+
+KEY_COLS = ['season', 'gw', 'h_title', 'a_title']
+ODDS_COLS = ['book_odds_h', 'book_odds_d', 'book_odds_a']
+# Added to the predictions export when predict_gw prices against an odds table
+BEST_PRICE_COLS = [
+    'best_book_h', 'best_book_d', 'best_book_a', 'n_bookmakers', 'overround', 'market_overround',
+    'implied_h', 'implied_d', 'implied_a',
+]
+
+AMERICAN = r'^[+-]\d+(?:\.\d+)?$'
+EVENS = ['evs', 'evens', 'even', 'ev']
+
+def _round3(values):
+    # np.round scales by 1000 first, so a value within float error of a half
+    # can round the other way from Python's round(); those few go through round()
+    rounded = np.round(values, 3)
+    with np.errstate(invalid='ignore'):
+        near_half = np.abs((values * 1000) % 1 - 0.5) < 1e-6
+    rounded[near_half] = [round(float(value), 3) for value in values[near_half]]
+    return rounded
+
+def _parse_prices(text, odds_format):
+    """Decimal odds for an array of distinct price strings."""
+    text = pd.Series(text, dtype=object).astype(str).str.strip()
+    parsed = np.full(len(text), np.nan)
+    if not len(text):
+        return parsed
+
+    parts = text.str.partition('/')
+    numerator = pd.to_numeric(parts[0].str.strip(), errors='coerce').to_numpy(dtype=float)
+    denominator = pd.to_numeric(parts[2].str.strip(), errors='coerce').to_numpy(dtype=float)
+    has_slash = (parts[1] == '/').to_numpy()
+    is_fraction = has_slash & (numerator >= 0) & (denominator > 0)
+    parsed[is_fraction] = numerator[is_fraction] / denominator[is_fraction] + 1
+    parsed[text.str.lower().isin(EVENS).to_numpy()] = 2.0
+
+    numbers = np.where(has_slash, np.nan, pd.to_numeric(text, errors='coerce'))
+    is_american = text.str.match(AMERICAN).to_numpy()
+    if odds_format == 'american':
+        is_american |= ~np.isnan(numbers)
+    is_american &= np.abs(numbers) >= 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        american = np.where(numbers > 0, 1 + numbers / 100, 1 + 100 / np.abs(numbers))
+    parsed = np.where(is_american, american, parsed)
+
+    is_decimal = np.isnan(parsed) & ~np.isnan(numbers)
+    parsed[is_decimal] = numbers[is_decimal]
+    return parsed
+
+def parse_odds(values, odds_format='auto'):
+    """
+    Decimal odds, rounded to 3 places, for a column of prices in any mix of
+    formats. With odds_format='auto' a signed number is American and an
+    unsigned one decimal; 'american' also reads unsigned numbers as American.
+    Unparseable prices, and decimals of 1 or less, come back as NaN.
+
+    A price list repeats the same few hundred quotes, so each distinct one is
+    parsed once and the results are mapped back with its factorized codes.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values) and odds_format != 'american':
+        parsed = values.to_numpy(dtype=float)
+    else:
+        codes, uniques = pd.factorize(values)
+        parsed_uniques = np.append(_parse_prices(np.asarray(uniques, dtype=object), odds_format), np.nan)
+        # Missing prices have code -1, the NaN appended last
+        parsed = parsed_uniques[codes]
+
+    parsed = _round3(parsed)
+    with np.errstate(invalid='ignore'):
+        parsed[~np.isfinite(parsed) | (parsed <= 1)] = np.nan
+    return pd.Series(parsed, index=values.index)
+
+def load_odds(path, odds_format='auto', season=None, gw=None):
+    """
+    Reads an odds table with every price parsed to decimal odds. Teams and
+    bookmakers are stored as categoricals, so a season of many bookmakers'
+    prices stays small. season and gw filter the rows before parsing.
+    """
+    odds = read_table(path)
+    if season is not None:
+        odds = odds[odds['season'] == season]
+    if gw is not None:
+        odds = odds[odds['gw'] == gw]
+    odds = odds.reset_index(drop=True)
+    for col in ODDS_COLS:
+        odds[col] = parse_odds(odds[col], odds_format)
+    for col in ['h_title', 'a_title', 'bookmaker']:
+        odds[col] = odds[col].astype('category')
+    odds['season'] = odds['season'].astype('int16')
+    odds['gw'] = odds['gw'].astype('int16')
+    return odds[KEY_COLS + ['bookmaker'] + ODDS_COLS]
+
+def best_prices(odds):
+    """
+    One row per fixture: the best price for each outcome and the bookmaker
+    offering it, how many bookmakers priced it, the overround of the best
+    prices (negative means an arbitrage) and of the average bookmaker, and
+    implied probabilities of the best prices with the margin removed.
+    """
+    grouped = odds.groupby(KEY_COLS, observed=True, sort=True)
+    best = grouped[ODDS_COLS].max()
+    best['n_bookmakers'] = grouped.size()
+
+    # Each bookmaker's own margin, averaged per fixture
+    book_overround = (1 / odds[ODDS_COLS]).sum(axis=1, min_count=3) - 1
+    best['market_overround'] = book_overround.groupby([odds[col] for col in KEY_COLS], observed=True).mean().round(4)
+
+    for col in ODDS_COLS:
+        # The first bookmaker listed wins a tie
+        top = odds.dropna(subset=[col]).sort_values(by=col, ascending=False, kind='stable')
+        best[f'best_book_{col[-1]}'] = top.drop_duplicates(subset=KEY_COLS).set_index(KEY_COLS)['bookmaker'].astype(str)
+
+    inverse = 1 / best[ODDS_COLS].to_numpy()
+    total = inverse.sum(axis=1)
+    best['overround'] = np.round(total - 1, 4)
+    for i, outcome in enumerate(['h', 'd', 'a']):
+        best[f'implied_{outcome}'] = inverse[:, i] / total
+
+    best = best.reset_index()
+    for col in ['h_title', 'a_title']:
+        best[col] = best[col].astype(str)
+    best[['season', 'gw']] = best[['season', 'gw']].astype('int64')
+    return best
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scripts.odds import parse_odds
+from scripts.predict import add_expected_values, bet_decisions
+
+KEY_COLS = ['h_title', 'a_title']
+ODDS_COLS = ['book_odds_h', 'book_odds_d', 'book_odds_a']
+EV_COLS = ['ev_h', 'ev_d', 'ev_a']
+PRED_COLS = ['pred_H', 'pred_D', 'pred_A']
+
+def parse_price(value):
+    """Decimal odds from a price in any format parse_odds reads ('5/2', 'evens', '+150', '3.5'), else NaN."""
+    return float(parse_odds([value]).iloc[0])
+
+def parse_update(line):
+    """
+    One feed line as {h_title, a_title, book_odds_*}, or None if it is blank or
+    malformed. Lines are JSON ({"h_title": ..., "a_title": ..., "book_odds_h": "5/2"})
+    or CSV (h_title,a_title,odds_h,odds_d,odds_a); a JSON update may carry only
+    the prices that moved.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    try:
+        if line.startswith('{'):
+            raw = json.loads(line)
+        else:
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) != 5:
+                return None
+            raw = dict(zip(KEY_COLS + ODDS_COLS, fields))
+    except ValueError:
+        return None
+    if not all(raw.get(col) for col in KEY_COLS):
+        return None
+    return {**{col: raw[col] for col in KEY_COLS}, **{col: parse_price(raw[col]) for col in ODDS_COLS if col in raw}}
+
+class LiveOdds:
+    """
+    The current gameweek's fixtures with their model probabilities, cached
+    from the predictions export, and the latest prices.
+
+    apply() takes a batch of price updates, re-scores only the fixtures whose
+    prices moved and returns those whose bet decision changed.
+    """
+
+    def __init__(self, predictions, threshold):
+        self.threshold = threshold
+        book = predictions.drop_duplicates(subset=KEY_COLS, keep='last').set_index(KEY_COLS)
+        book = add_expected_values(book[PRED_COLS + ODDS_COLS].astype(float))
+        book['bet_decision'] = bet_decisions(book, threshold)
+        self.book = book
+
+    def apply(self, updates):
+        if updates.empty:
+            return pd.DataFrame()
+        updates = updates.drop_duplicates(subset=KEY_COLS, keep='last').set_index(KEY_COLS)
+        unknown = ~updates.index.isin(self.book.index)
+        for h_title, a_title in updates.index[unknown]:
+            print(f"⚠️ Odds update for unknown fixture {h_title} v {a_title}")
+        updates = updates[~unknown].reindex(columns=ODDS_COLS)
+
+        # A partial update keeps the fixture's other prices
+        current = self.book.loc[updates.index, ODDS_COLS]
+        prices = updates.where(updates.notna(), current)
+        moved = (prices.to_numpy() != current.to_numpy()).any(axis=1)
+        if not moved.any():
+            return pd.DataFrame()
+
+        rows = self.book.loc[prices.index[moved]].copy()
+        rows[ODDS_COLS] = prices[moved]
+        rows = add_expected_values(rows)
+        previous = rows['bet_decision'].copy()
+        rows['bet_decision'] = bet_decisions(rows, self.threshold)
+        self.book.loc[rows.index, ODDS_COLS + EV_COLS + ['bet_decision']] = rows[ODDS_COLS + EV_COLS + ['bet_decision']]
+
+        changed = rows[rows['bet_decision'] != previous].assign(previous_decision=previous)
+        return changed.reset_index()
+
+def follow(path, poll_interval=0.05, from_start=False):
+    """
+    Yields the lines appended to path as they arrive, a batch per read, like
+    tail -f. Starts again from the top if the file is truncated or replaced.
+    path '-' reads stdin instead.
+    """
+    if path == '-':
+        for line in sys.stdin:
+            yield [line]
+        return
+
+    position, inode, buffer = None, None, b''
+    while True:
+        if not os.path.exists(path):
+            time.sleep(poll_interval)
+            continue
+        stat = os.stat(path)
+        if position is None:
+            position = 0 if from_start else stat.st_size
+        elif stat.st_ino != inode or stat.st_size < position:
+            position, buffer = 0, b''
+        inode = stat.st_ino
+
+        if stat.st_size == position:
+            time.sleep(poll_interval)
+            continue
+        with open(path, 'rb') as f:
+            f.seek(position)
+            chunk = f.read()
+            position = f.tell()
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        if lines:
+            yield [line.decode('utf-8', errors='replace') for line in lines]
+
+def run_odds_stream(predictions_path, feed_path, threshold, output_path=None, poll_interval=0.05, from_start=False,
+                    max_updates=None):
+    """
+    Tails feed_path for price updates to the fixtures in predictions_path and
+    prints each bet decision they change, appending it as a JSON line to
+    output_path. Stops after max_updates feed lines, or on Ctrl+C.
+    """
+    if not os.path.exists(predictions_path):
+        raise FileNotFoundError(f"No predictions at {predictions_path}: run `python run_pipeline.py predict` first")
+    live = LiveOdds(pd.read_csv(predictions_path), threshold)
+    print(f"Watching {feed_path} for odds on {len(live.book)} fixtures (EV threshold {threshold})")
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    seen = 0
+    try:
+        for lines in follow(feed_path, poll_interval, from_start):
+            received = time.perf_counter()
+            updates = [update for update in map(parse_update, lines) if update is not None]
+            changes = live.apply(pd.DataFrame(updates, columns=KEY_COLS + ODDS_COLS))
+            latency_ms = round((time.perf_counter() - received) * 1000, 2)
+
+            for change in changes.to_dict('records'):
+                event = {
+                    'time': datetime.now().isoformat(timespec='milliseconds'),
+                    **{col: change[col] for col in KEY_COLS + ODDS_COLS + EV_COLS},
+                    'previous_decision': change['previous_decision'],
+                    'bet_decision': change['bet_decision'],
+                    'latency_ms': latency_ms,
+                }
+                print(f"🔄 {change['h_title']} v {change['a_title']}: {change['previous_decision']} -> "
+                      f"{change['bet_decision']} (odds {change['book_odds_h']}/{change['book_odds_d']}/"
+                      f"{change['book_odds_a']}, {latency_ms}ms)")
+                if output_path:
+                    with open(output_path, 'a') as f:
+                        f.write(json.dumps(event) + '\n')
+
+            seen += len(lines)
+            if max_updates is not None and seen >= max_updates:
+                break
+    except KeyboardInterrupt:
+        pass
+    return live.book.reset_index()
@@ -1,14 +1,17 @@
+import numpy as np
 import pandas as pd
+from scripts.odds import BEST_PRICE_COLS, KEY_COLS as ODDS_KEY_COLS, ODDS_COLS, best_prices, load_odds
+from scripts.storage import SCHEMAS, read_table, stage_path, write_table
 
-def predict_gw(gw_to_predict, season_to_predict, threshold, model, le, feature_cols, final_trainset_path, output_predictions_path):
-    # Load upcoming fixtures
-    df = pd.read_csv(final_trainset_path)
-    df = df[((df['season'] == season_to_predict) & (df['gw'] == gw_to_predict))]
-
-    # Preprocessing datetime if needed
-    if 'datetime' in df.columns:
-        df['datetime'] = pd.to_datetime(df['datetime'])
+OUTPUT_COLS = [
+    'datetime', 'season', 'gw', 'h_title', 'a_title',
+    'book_odds_h', 'book_odds_d', 'book_odds_a',
+    'pred_H', 'pred_D', 'pred_A',
+    'bet_decision', 'predicted_outcome'
+]
 
+def score_fixtures(df, model, le, feature_cols, threshold):
+    """Adds probabilities, implied probabilities, EVs and a bet decision to fixtures that carry feature_cols."""
     # Dummy target column (required for LabelEncoder structure)
     if 'outcome' not in df.columns:
         df['outcome'] = 'Unknown'  # just placeholder
@@ -31,31 +34,63 @@ def predict_gw(gw_to_predict, season_to_predict, threshold, model, le, feature_c
     total_implied = df[['implied_h', 'implied_d', 'implied_a']].sum(axis=1)
     df[['implied_h', 'implied_d', 'implied_a']] = df[['implied_h', 'implied_d', 'implied_a']].div(total_implied, axis=0)
 
-    # Calculate expected value
+    # Calculate expected value and make betting decisions
+    df = add_expected_values(df)
+    df['bet_decision'] = bet_decisions(df, threshold)
+
+    return df
+
+def add_expected_values(df):
     for label, prob_col, odds_col in zip(['H', 'D', 'A'], ['pred_H', 'pred_D', 'pred_A'], ['book_odds_h', 'book_odds_d', 'book_odds_a']):
         df[f'ev_{label.lower()}'] = round(df[prob_col] * df[odds_col] - 1, 2)
+    return df
+
+def bet_decisions(df, threshold):
+    """The outcome with the highest EV above threshold (H before D before A on ties), else 'No Bet'."""
+    evs = df[['ev_h', 'ev_d', 'ev_a']].to_numpy(dtype=float)
+    positive = np.where(evs > threshold, evs, -np.inf)
+    best = positive.argmax(axis=1)
+    decisions = np.array(['H', 'D', 'A'], dtype=object)[best]
+    return pd.Series(np.where(np.isinf(positive.max(axis=1)), 'No Bet', decisions), index=df.index, dtype=object)
+
+def price_at_best_odds(df, best, threshold):
+    """
+    Re-prices scored fixtures at the best odds in best (from scripts.odds.best_prices)
+    and recomputes their EVs and bet decisions; outcomes no bookmaker priced keep their odds.
+    """
+    df = df.drop(columns=[col for col in BEST_PRICE_COLS if col in df.columns])
+    df = df.merge(best.drop(columns=ODDS_COLS).join(best[ODDS_COLS].add_prefix('best_')), on=ODDS_KEY_COLS, how='left')
+    for col in ODDS_COLS:
+        df[col] = df[f'best_{col}'].fillna(df[col])
+    df = df.drop(columns=[f'best_{col}' for col in ODDS_COLS])
+    df = add_expected_values(df)
+    df['bet_decision'] = bet_decisions(df, threshold)
+    return df
+
+def predict_gw(gw_to_predict, season_to_predict, threshold, model, le, feature_cols, final_trainset_path, output_predictions_path,
+               storage_format='csv', odds_path=None, odds_format='auto'):
+    # Load upcoming fixtures
+    df = read_table(final_trainset_path, SCHEMAS['trainset'])
+    df = df[((df['season'] == season_to_predict) & (df['gw'] == gw_to_predict))]
+
+    # Preprocessing datetime if needed
+    if 'datetime' in df.columns:
+        df['datetime'] = pd.to_datetime(df['datetime'])
+
+    df = score_fixtures(df, model, le, feature_cols, threshold)
+    output_cols = OUTPUT_COLS
 
-    def decide_bet(row, threshold=threshold):
-        evs = {
-            'H': row['ev_h'],
-            'D': row['ev_d'],
-            'A': row['ev_a']
-        }
-        positive_evs = {k: v for k, v in evs.items() if v > threshold}
-        if not positive_evs:
-            return 'No Bet'
-        return max(positive_evs, key=positive_evs.get)
-    
-    # Make betting decisions
-    df['bet_decision'] = df.apply(decide_bet, axis=1)
+    # With a multi-bookmaker odds table, bet at the best price on offer
+    if odds_path:
+        best = best_prices(load_odds(odds_path, odds_format, season_to_predict, gw_to_predict))
+        df = price_at_best_odds(df, best, threshold)
+        output_cols = OUTPUT_COLS + BEST_PRICE_COLS
+        print(f"Priced {best['n_bookmakers'].sum()} bookmaker quotes; best-price overround {best['overround'].mean():.2%}")
 
     # Output
-    output_cols = [
-        'datetime', 'season', 'gw', 'h_title', 'a_title',
-        'book_odds_h', 'book_odds_d', 'book_odds_a',
-        'pred_H', 'pred_D', 'pred_A',
-        'bet_decision', 'predicted_outcome'
-    ]
+    # CSV stays the dashboard export; a columnar copy sits alongside it
     df[output_cols].to_csv(output_predictions_path, index=False)
+    if storage_format != 'csv':
+        write_table(df[output_cols], stage_path(output_predictions_path, storage_format), SCHEMAS['predictions'])
     print("Predictions saved")
     return df[output_cols]
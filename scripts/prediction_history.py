@@ -0,0 +1,236 @@
+import glob
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scripts.storage import STORAGE_FORMATS, SCHEMAS, read_table, stage_path, write_table
+
+# Append-only store of every prediction and how it settled, one folder per
+# gameweek: {store_dir}/season=2025/gw=11/predictions-{recorded_at}.csv and
+# settlements-{recorded_at}.csv. Files are only ever added; a partition's
+# latest predictions file is the one that counts, joined to its latest
+# settlement. Two small index tables at the top level say which partitions
+# hold which teams and carry each gameweek's stake and profit, so queries
+# read only the partitions they need and ROI needs no partition at all.
+
+INDEX_FILE = '_index'
+PARTITIONS_FILE = '_partitions'
+INDEX_COLS = ['season', 'gw', 'team', 'partition']
+PARTITION_COLS = ['season', 'gw', 'partition', 'predictions', 'bets', 'settled', 'staked', 'profit', 'updated_at']
+SETTLEMENT_COLS = ['h_title', 'a_title', 'goals_h', 'goals_a', 'outcome', 'settled_at']
+BET_ODDS = {'H': 'book_odds_h', 'D': 'book_odds_d', 'A': 'book_odds_a'}
+
+# Partition and index reads, keyed by path and mtime, so repeat queries are free
+_loaded = {}
+
+def partition_name(season, gw):
+    return f"season={int(season)}/gw={int(gw):02d}"
+
+def _table_path(store_dir, name, storage_format):
+    return stage_path(os.path.join(store_dir, name), storage_format)
+
+def _files(store_dir, partition, kind):
+    """A partition's files of one kind, oldest first; names sort by their timestamp."""
+    pattern = os.path.join(store_dir, partition, f"{kind}-*")
+    return sorted(path for path in glob.glob(pattern) if os.path.splitext(path)[1] in STORAGE_FORMATS.values())
+
+def _read(path, schema=None):
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+    if key not in _loaded:
+        _loaded[key] = read_table(path, schema)
+    return _loaded[key]
+
+def _write_atomic(df, path, schema=None):
+    # Readers such as the dashboard never see a half-written index
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.tmp{ext}"
+    write_table(df, tmp_path, schema)
+    os.replace(tmp_path, path)
+
+def _timestamp():
+    return datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+def add_bet_columns(predictions):
+    """EVs of every outcome (as predict computes them) and the odds and EV of the chosen bet."""
+    df = predictions.copy()
+    for label, odds_col in BET_ODDS.items():
+        df[f'ev_{label.lower()}'] = round(df[f'pred_{label}'] * df[odds_col] - 1, 2)
+    df['bet_odds'] = np.select(
+        [df['bet_decision'] == label for label in BET_ODDS], [df[col] for col in BET_ODDS.values()], default=np.nan
+    )
+    df['bet_ev'] = np.select(
+        [df['bet_decision'] == label for label in BET_ODDS], [df[f'ev_{label.lower()}'] for label in BET_ODDS],
+        default=np.nan
+    )
+    return df
+
+def settle(predictions, settlements):
+    """Joins predictions to their results; profit is for a £1 stake on the bet, 0 for No Bet or unplayed."""
+    df = predictions.merge(settlements, on=['h_title', 'a_title'], how='left')
+    df['settled'] = df['outcome'].notna()
+    df['staked'] = (df['settled'] & df['bet_decision'].isin(list(BET_ODDS))).astype(float)
+    df['won'] = df['staked'].astype(bool) & (df['bet_decision'] == df['outcome'])
+    df['profit'] = np.where(df['won'], df['bet_odds'] - 1, -df['staked'])
+    return df
+
+def _same_predictions(a, b):
+    cols = [col for col in a.columns if col != 'recorded_at']
+    if list(b.columns.drop('recorded_at', errors='ignore')) != cols or len(a) != len(b):
+        return False
+    return a[cols].astype(str).reset_index(drop=True).equals(b[cols].astype(str).reset_index(drop=True))
+
+def record_predictions(store_dir, predictions, storage_format='csv'):
+    """
+    Appends one gameweek's predictions to the store, one file per (season, gw)
+    in predictions. Predictions identical to ones already recorded for their
+    gameweek are left alone, so the same exports can be offered every run.
+    Returns the partitions written.
+    """
+    written = []
+    for (season, gw), group in predictions.groupby(['season', 'gw'], sort=True):
+        partition = partition_name(season, gw)
+        group = add_bet_columns(group.reset_index(drop=True))
+        existing = _files(store_dir, partition, 'predictions')
+        if any(_same_predictions(group, _read(path, SCHEMAS['predictions'])) for path in existing):
+            continue
+
+        os.makedirs(os.path.join(store_dir, partition), exist_ok=True)
+        group['recorded_at'] = datetime.now().isoformat(timespec='seconds')
+        write_table(group, _table_path(store_dir, f"{partition}/predictions-{_timestamp()}", storage_format),
+                    SCHEMAS['predictions'])
+        written.append(partition)
+    if written:
+        update_index(store_dir, written, storage_format)
+    return written
+
+def record_settlements(store_dir, matches, storage_format='csv'):
+    """
+    Settles every partition with unsettled predictions whose matches now have
+    results in matches (the raw Understat match table), appending a settlements
+    file to each. Returns the partitions settled.
+    """
+    partitions = load_partitions(store_dir, storage_format)
+    open_partitions = partitions[partitions['settled'] < partitions['predictions']]
+    if open_partitions.empty:
+        return []
+
+    results = matches[['season', 'h_title', 'a_title', 'goals_h', 'goals_a']].dropna(subset=['goals_h', 'goals_a'])
+    results = results.assign(outcome=np.select(
+        [results['goals_h'] > results['goals_a'], results['goals_h'] == results['goals_a']], ['H', 'D'], default='A'
+    ))
+
+    written = []
+    for row in open_partitions.itertuples():
+        predictions = latest_partition(store_dir, row.partition, settled=False)
+        played = predictions[['h_title', 'a_title']].merge(
+            results[results['season'] == row.season], on=['h_title', 'a_title']
+        )
+        settlements = _files(store_dir, row.partition, 'settlements')
+        if played.empty or (settlements and len(_read(settlements[-1])) >= len(played)):
+            continue
+        played['settled_at'] = datetime.now().isoformat(timespec='seconds')
+        write_table(played[SETTLEMENT_COLS].drop_duplicates(subset=['h_title', 'a_title']),
+                    _table_path(store_dir, f"{row.partition}/settlements-{_timestamp()}", storage_format))
+        written.append(row.partition)
+    if written:
+        update_index(store_dir, written, storage_format)
+    return written
+
+def latest_partition(store_dir, partition, settled=True):
+    """The latest predictions of one partition, joined to its latest settlement unless settled=False."""
+    predictions = _files(store_dir, partition, 'predictions')
+    if not predictions:
+        return pd.DataFrame()
+    df = _read(predictions[-1], SCHEMAS['predictions'])
+    if not settled:
+        return df
+    settlements = _files(store_dir, partition, 'settlements')
+    settlements = _read(settlements[-1]) if settlements else pd.DataFrame(columns=SETTLEMENT_COLS)
+    return settle(df, settlements)
+
+def update_index(store_dir, partitions, storage_format='csv'):
+    """Rewrites the team index and gameweek totals of the given partitions."""
+    index_rows, partition_rows = [], []
+    for partition in partitions:
+        df = latest_partition(store_dir, partition)
+        season, gw = int(df['season'].iloc[0]), int(df['gw'].iloc[0])
+        teams = pd.unique(pd.concat([df['h_title'], df['a_title']]))
+        index_rows.append(pd.DataFrame({'season': season, 'gw': gw, 'team': teams, 'partition': partition}))
+        partition_rows.append({
+            'season': season,
+            'gw': gw,
+            'partition': partition,
+            'predictions': len(df),
+            'bets': int(df['bet_decision'].isin(list(BET_ODDS)).sum()),
+            'settled': int(df['settled'].sum()),
+            'staked': float(df['staked'].sum()),
+            'profit': round(float(df['profit'].sum()), 2),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        })
+
+    for name, cols, new_rows, sort_cols in [
+        (INDEX_FILE, INDEX_COLS, pd.concat(index_rows, ignore_index=True), ['season', 'gw', 'team']),
+        (PARTITIONS_FILE, PARTITION_COLS, pd.DataFrame(partition_rows), ['season', 'gw']),
+    ]:
+        path = _table_path(store_dir, name, storage_format)
+        if os.path.exists(path):
+            table = read_table(path)
+            new_rows = pd.concat([table[~table['partition'].isin(partitions)], new_rows], ignore_index=True)
+        _write_atomic(new_rows[cols].sort_values(by=sort_cols, kind='stable').reset_index(drop=True), path)
+
+def load_index(store_dir, storage_format='csv'):
+    path = _table_path(store_dir, INDEX_FILE, storage_format)
+    return _read(path) if os.path.exists(path) else pd.DataFrame(columns=INDEX_COLS)
+
+def load_partitions(store_dir, storage_format='csv'):
+    path = _table_path(store_dir, PARTITIONS_FILE, storage_format)
+    return _read(path) if os.path.exists(path) else pd.DataFrame(columns=PARTITION_COLS)
+
+def query_history(store_dir, season=None, gw=None, team=None, storage_format='csv'):
+    """
+    Settled history of the predictions matching season, gw and team (each a
+    value, a list or None for all). Only the partitions the index points to
+    are read, e.g.
+
+        bets = query_history(store_dir, season=2025)
+        bets[(bets['bet_decision'] == 'A') & (bets['bet_ev'] > 0.1)]
+    """
+    index = load_index(store_dir, storage_format)
+    for col, value in [('season', season), ('gw', gw), ('team', team)]:
+        if value is not None:
+            index = index[index[col].isin(value if isinstance(value, (list, tuple, set)) else [value])]
+
+    frames = [latest_partition(store_dir, partition) for partition in index['partition'].unique()]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if team is not None:
+        teams = team if isinstance(team, (list, tuple, set)) else [team]
+        df = df[df['h_title'].isin(teams) | df['a_title'].isin(teams)]
+    return df.reset_index(drop=True)
+
+def roi_by_gameweek(store_dir, season=None, storage_format='csv'):
+    """Stake, profit and cumulative ROI per settled gameweek, from the index alone."""
+    partitions = load_partitions(store_dir, storage_format)
+    if season is not None:
+        partitions = partitions[partitions['season'] == season]
+    df = partitions[partitions['settled'] > 0][['season', 'gw', 'bets', 'staked', 'profit']].reset_index(drop=True)
+    # An empty index has no column types to go on
+    df = df.astype({'staked': float, 'profit': float})
+    df['cumulative_staked'] = df['staked'].cumsum()
+    df['cumulative_profit'] = df['profit'].cumsum().round(2)
+    df['roi_percent'] = (df['profit'] / df['staked'] * 100).round(2)
+    df['cumulative_roi_percent'] = (df['cumulative_profit'] / df['cumulative_staked'] * 100).round(2)
+    return df
+
+def update_history(store_dir, predictions_paths, matches, storage_format='csv'):
+    """
+    Records any new predictions files, in the order given (oldest gameweek
+    first, so backfills keep their order), and settles what has been played.
+    """
+    recorded = []
+    for path in predictions_paths:
+        recorded += record_predictions(store_dir, read_table(path, SCHEMAS['predictions']), storage_format)
+    settled = record_settlements(store_dir, matches, storage_format)
+    print(f"Prediction history: {len(recorded)} gameweeks recorded, {len(settled)} settled")
+    return recorded, settled
@@ -0,0 +1,202 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# pandas is imported only when a log is written or compared, so the CLI can
+# import this module at startup without paying for it
+
+# Measurements of the current run, in the order they finished
+_records = []
+# Records still being measured, innermost last, so nested calls know their stage
+_open = []
+_network = {'bytes': 0}
+_network_lock = threading.Lock()
+
+# process_peak_rss_mb is the process's peak RSS so far (ru_maxrss), not the
+# stage's own: the OS keeps only a lifetime high-water mark. rss_growth_mb is
+# how far the block raised it, so a stage that stays under an earlier peak
+# shows 0 there.
+RECORD_COLS = [
+    'name', 'kind', 'stage', 'status', 'wall_s', 'cpu_s', 'process_peak_rss_mb', 'rss_growth_mb',
+    'rows_in', 'rows_out', 'network_bytes',
+]
+# Logs written before the rename
+LEGACY_COLS = {'peak_rss_mb': 'process_peak_rss_mb'}
+
+def process_peak_rss_mb():
+    """Peak RSS of this process or its largest finished child so far, in MB."""
+    # ru_maxrss is in KB on Linux, bytes on macOS; children covers pool workers
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / 1e6
+
+def _cpu_seconds():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+
+def _is_frame(value):
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(value, pd.DataFrame)
+
+def count_rows(value):
+    if _is_frame(value):
+        return len(value)
+    if isinstance(value, tuple):
+        counts = [len(item) for item in value if _is_frame(item)]
+        return sum(counts) if counts else None
+    return None
+
+def count_network_bytes(n):
+    with _network_lock:
+        _network['bytes'] += n
+
+def network_byte_hook(response, *args, **kwargs):
+    """requests response hook that counts body bytes against the running stage."""
+    count_network_bytes(len(response.content))
+
+def note_rows_in(n):
+    """Adds n input rows to the innermost measurement, e.g. for upstream data a stage loads."""
+    if _open and n is not None:
+        _open[-1]['rows_in'] = (_open[-1]['rows_in'] or 0) + n
+
+def note_rows_out(n):
+    if _open and n is not None:
+        _open[-1]['rows_out'] = (_open[-1]['rows_out'] or 0) + n
+
+@contextmanager
+def measure(name, kind='stage', rows_in=None, profile_path=None):
+    """
+    Records wall time, CPU time, process peak RSS, rows and network bytes for the enclosed block.
+
+    With profile_path the block also runs under cProfile, dumped there as .prof
+    (for snakeviz or flameprof) with a cumulative-time summary next to it as .txt.
+    """
+    record = {
+        'name': name,
+        'kind': kind,
+        'stage': _open[0]['name'] if _open else name,
+        'status': 'ran',
+        'rows_in': rows_in,
+        'rows_out': None,
+    }
+    _open.append(record)
+    rss_before = process_peak_rss_mb()
+    network_before = _network['bytes']
+    profiler = cProfile.Profile() if profile_path else None
+    cpu_start, wall_start = _cpu_seconds(), time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield record
+    except Exception:
+        record['status'] = 'failed'
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(_cpu_seconds() - cpu_start, 4)
+        record['process_peak_rss_mb'] = round(process_peak_rss_mb(), 1)
+        record['rss_growth_mb'] = round(record['process_peak_rss_mb'] - rss_before, 1)
+        record['network_bytes'] = _network['bytes'] - network_before
+        _open.pop()
+        _records.append(record)
+
+        if profiler:
+            os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+            profiler.dump_stats(profile_path)
+            with open(os.path.splitext(profile_path)[0] + '.txt', 'w') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(30)
+
+def profiled(func):
+    """Measures every call to func; rows in and out are the lengths of its first DataFrame argument and its result."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        rows_in = next((len(arg) for arg in [*args, *kwargs.values()] if _is_frame(arg)), None)
+        with measure(func.__name__, kind='function', rows_in=rows_in) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = count_rows(result)
+        return result
+    return wrapper
+
+def record_skipped(name):
+    _records.append({'name': name, 'kind': 'stage', 'stage': name, 'status': 'skipped'})
+
+def new_run_id():
+    """A timestamp run id; microseconds keep two runs started in the same second apart."""
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+def reset_run():
+    _records.clear()
+
+def write_run_log(log_dir, run_id, metadata=None):
+    """
+    Writes this run's measurements as {log_dir}/{run_id}.json and appends
+    them to {log_dir}/run_log.csv, one row per stage or function call.
+    """
+    import pandas as pd
+
+    os.makedirs(log_dir, exist_ok=True)
+    log = {'run_id': run_id, **(metadata or {}), 'records': list(_records)}
+    path = os.path.join(log_dir, f"{run_id}.json")
+    with open(path, 'w') as f:
+        json.dump(log, f, indent=2, default=str)
+
+    rows = pd.DataFrame(_records).reindex(columns=RECORD_COLS)
+    rows.insert(0, 'run_id', run_id)
+    csv_path = os.path.join(log_dir, 'run_log.csv')
+    rows.to_csv(csv_path, mode='a', header=not os.path.exists(csv_path), index=False)
+    return path
+
+def list_runs(log_dir):
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(name[:-5] for name in os.listdir(log_dir) if name.endswith('.json'))
+
+def load_run_log(log_dir, run_id):
+    with open(os.path.join(log_dir, f"{run_id}.json"), 'r') as f:
+        return json.load(f)
+
+def _summarise(log):
+    """Totals per stage and per function, over the records that ran."""
+    import pandas as pd
+
+    records = pd.DataFrame(log['records']).rename(columns=LEGACY_COLS).reindex(columns=RECORD_COLS)
+    records = records[records['status'] != 'skipped']
+    return records.groupby(['kind', 'name'], sort=False).agg(
+        calls=('name', 'size'),
+        wall_s=('wall_s', 'sum'),
+        cpu_s=('cpu_s', 'sum'),
+        process_peak_rss_mb=('process_peak_rss_mb', 'max'),
+        rss_growth_mb=('rss_growth_mb', 'sum'),
+        network_bytes=('network_bytes', 'sum'),
+    )
+
+def compare_runs(log_dir, base_run_id, new_run_id, threshold=0.2, min_seconds=0.05):
+    """
+    Stage and function timings of two runs side by side.
+
+    A row is flagged as regressed when its wall time grew by more than
+    threshold (a fraction) and by at least min_seconds.
+    """
+    base = _summarise(load_run_log(log_dir, base_run_id))
+    new = _summarise(load_run_log(log_dir, new_run_id))
+    comparison = base.join(new, how='outer', lsuffix='_base', rsuffix='_new').reset_index()
+
+    change = comparison['wall_s_new'] - comparison['wall_s_base']
+    comparison['wall_change_percent'] = (change / comparison['wall_s_base'] * 100).round(1)
+    comparison['regressed'] = (change > min_seconds) & (change > comparison['wall_s_base'] * threshold)
+    return comparison[[
+        'kind', 'name', 'wall_s_base', 'wall_s_new', 'wall_change_percent', 'regressed',
+        'cpu_s_base', 'cpu_s_new', 'process_peak_rss_mb_base', 'process_peak_rss_mb_new',
+        'rss_growth_mb_base', 'rss_growth_mb_new', 'network_bytes_base', 'network_bytes_new',
+    ]]
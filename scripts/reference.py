@@ -0,0 +1,152 @@
+import pandas as pd
+
+# Row-by-row implementations the feature code started from, kept as the
+# reference that scripts.benchmark checks the optimised paths against.
+# They are O(n^2); only run them on small synthetic data.
+
+def reference_h2h_features(matches_df, n=5):
+    matches_df = matches_df.sort_values(by='datetime')
+    h2h_data = []
+
+    for idx, row in matches_df.iterrows():
+        h_id, a_id, match_date = row['h_id'], row['a_id'], row['datetime']
+
+        # Find past H2H matches before current match
+        past_matches = matches_df[
+            (((matches_df['h_id'] == h_id) & (matches_df['a_id'] == a_id)) |
+             ((matches_df['h_id'] == a_id) & (matches_df['a_id'] == h_id))) &
+            (matches_df['datetime'] < match_date)
+        ].sort_values(by='datetime', ascending=False).head(n)
+
+        # Initialize features
+        h_wins, a_wins, draws, goal_diff_sum = 0, 0, 0, 0
+
+        for _, past in past_matches.iterrows():
+            home = past['h_id']
+            away = past['a_id']
+            gh = past['goals_h']
+            ga = past['goals_a']
+
+            if gh > ga:
+                winner = 'H'
+            elif gh < ga:
+                winner = 'A'
+            else:
+                winner = 'D'
+
+            if winner == 'H' and home == h_id:
+                h_wins += 1
+            elif winner == 'A' and away == h_id:
+                h_wins += 1
+            elif winner == 'H' and home == a_id:
+                a_wins += 1
+            elif winner == 'A' and away == a_id:
+                a_wins += 1
+            else:
+                draws += 1
+
+            goal_diff = (gh - ga) if home == h_id else (ga - gh)
+            goal_diff_sum += goal_diff
+
+        h2h_data.append({
+            'h2h_home_wins': h_wins,
+            'h2h_away_wins': a_wins,
+            'h2h_draws': draws,
+            'h2h_goal_diff_avg': round(goal_diff_sum / max(1, len(past_matches)), 3),
+            'h2h_matches_played': len(past_matches)
+        })
+
+    h2h_df = pd.DataFrame(h2h_data)
+    return pd.concat([matches_df.reset_index(drop=True), h2h_df], axis=1)
+
+def reference_recent_form(df, team_col, side='h', n=5):
+    df = df.sort_values(by='datetime')
+    form_stats = []
+
+    for idx, row in df.iterrows():
+        team_id = row[team_col]
+        match_date = row['datetime']
+
+        # Filter past matches involving this team
+        past_matches = df[
+            (((df['h_id'] == team_id) | (df['a_id'] == team_id)) &
+             (df['datetime'] < match_date))
+        ].sort_values(by='datetime', ascending=False).head(n)
+
+        points = goals_scored = goals_conceded = xg_for = xg_against = 0
+
+        for _, match in past_matches.iterrows():
+            if match['h_id'] == team_id:
+                goals_scored += match['goals_h']
+                goals_conceded += match['goals_a']
+                xg_for += match['xG_h']
+                xg_against += match['xG_a']
+                result = match['goals_h'] - match['goals_a']
+            else:
+                goals_scored += match['goals_a']
+                goals_conceded += match['goals_h']
+                xg_for += match['xG_a']
+                xg_against += match['xG_h']
+                result = match['goals_a'] - match['goals_h']
+
+            if result > 0:
+                points += 3
+            elif result == 0:
+                points += 1
+
+        form_stats.append({
+            f'{side}_form_points': points,
+            f'{side}_form_goals_scored': goals_scored,
+            f'{side}_form_goals_conceded': goals_conceded,
+            f'{side}_form_xg': round(xg_for / max(1, len(past_matches)), 3),
+            f'{side}_form_xga': round(xg_against / max(1, len(past_matches)), 3)
+        })
+
+    return pd.concat([df.reset_index(drop=True), pd.DataFrame(form_stats)], axis=1)
+
+def reference_merge_elo_ratings(trainset, elo_data, date_col='datetime'):
+    """
+    Merge Elo ratings into fixture data based on date ranges and team names.
+
+    Adds 'h_elo' and 'a_elo' columns to trainset using elo_data, matching:
+    - h_title/a_title to elo_data['title']
+    - datetime to elo_data[From:To] date interval
+    """
+    # Ensure all relevant columns are datetime
+    trainset = trainset.copy()
+    trainset[date_col] = pd.to_datetime(trainset[date_col])
+    elo_data = elo_data.copy()
+    elo_data['From'] = pd.to_datetime(elo_data['From'])
+    elo_data['To'] = pd.to_datetime(elo_data['To']) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)  # make 'To' inclusive
+
+    def merge_side(fixtures_df, elo_df, team_col, prefix):
+        # Merge fixtures with Elo data on team name
+        merged = fixtures_df.merge(
+            elo_df,
+            left_on=team_col,
+            right_on='title',
+            how='left'
+        )
+
+        # Filter for rows where fixture datetime falls within Elo date range
+        in_range = (merged[date_col] >= merged['From']) & (merged[date_col] <= merged['To'])
+        merged = merged[in_range]
+
+        # Keep only necessary columns
+        merged = merged[[*fixtures_df.columns, 'Elo']]
+        merged = merged.rename(columns={'Elo': f'{prefix}_elo'})
+
+        return merged.drop_duplicates(subset=fixtures_df.columns)
+
+    fixtures_with_home = merge_side(trainset, elo_data, 'h_title', 'h')
+    fixtures_with_both = merge_side(fixtures_with_home, elo_data, 'a_title', 'a')
+
+    return fixtures_with_both
+
+def reference_bet_odds(bets):
+    return bets.apply(
+        lambda row: row['book_odds_h'] if row['prediction'] == 'H'
+        else row['book_odds_d'] if row['prediction'] == 'D'
+        else row['book_odds_a'],
+        axis=1
+    )
@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import joblib
+import pandas as pd
+from scripts.odds import ODDS_COLS, parse_odds
+from scripts.predict import OUTPUT_COLS, score_fixtures
+from scripts.storage import SCHEMAS, read_table
+
+# A fixture is looked up in the final trainset by these columns
+FIXTURE_KEY = ['season', 'h_title', 'a_title']
+RESPONSE_COLS = [*OUTPUT_COLS, 'ev_h', 'ev_d', 'ev_a']
+
+class ModelState:
+    """One loaded model with its label encoder, feature columns and fixture features. Never mutated after loading."""
+
+    def __init__(self, model, le, feature_cols, features, version):
+        self.model = model
+        self.le = le
+        self.feature_cols = feature_cols
+        self.features = features
+        self.version = version
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+
+def file_versions(paths):
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in paths)
+
+def load_model_state(model_path, label_encoder_path, features_path, final_trainset_path):
+    paths = [model_path, label_encoder_path, features_path, final_trainset_path]
+    version = file_versions(paths)
+
+    with open(features_path, 'r') as f:
+        feature_cols = json.load(f)
+    model = joblib.load(model_path)
+    le = joblib.load(label_encoder_path)
+    if getattr(model, 'n_features_in_', len(feature_cols)) != len(feature_cols):
+        raise ValueError(f"Model expects {model.n_features_in_} features but {features_path} lists {len(feature_cols)}")
+
+    features = read_table(final_trainset_path, SCHEMAS['trainset'])
+    features['datetime'] = pd.to_datetime(features['datetime'])
+    features = features.drop_duplicates(subset=FIXTURE_KEY, keep='last').set_index(FIXTURE_KEY).sort_index()
+    return ModelState(model, le, feature_cols, features, version)
+
+class ScoringService:
+    """
+    Keeps a model and the fixture features in memory and scores batches of fixtures.
+
+    Each request reads self.state once and scores with it to the end, so a
+    reload only swaps the reference: requests already in flight finish on the
+    model they started with and none are dropped.
+    """
+
+    def __init__(self, model_path, label_encoder_path, features_path, final_trainset_path, threshold):
+        self.paths = [model_path, label_encoder_path, features_path, final_trainset_path]
+        self.threshold = threshold
+        self._reload_lock = threading.Lock()
+        self.state = load_model_state(*self.paths)
+
+    def reload(self, force=False):
+        """Loads the model files again if they changed. A failed load keeps the current model."""
+        with self._reload_lock:
+            if not force and file_versions(self.paths) == self.state.version:
+                return False
+            try:
+                state = load_model_state(*self.paths)
+            except Exception as e:
+                print(f"⚠️ Model reload failed, still serving the model loaded at {self.state.loaded_at}: {e}")
+                return False
+            self.state = state
+            print(f"🔄 Model reloaded at {state.loaded_at}")
+            return True
+
+    def watch(self, interval, stop):
+        """
+        Polls the model files every interval seconds and reloads once they stop changing.
+
+        train_model writes its files one after another, so a reload waits until
+        a poll sees the same versions as the one before it.
+        """
+        previous = file_versions(self.paths)
+        while not stop.wait(interval):
+            current = file_versions(self.paths)
+            if current == previous and current != self.state.version:
+                self.reload()
+            previous = current
+
+    def score(self, fixtures, threshold=None):
+        """
+        Scores a batch of fixtures, given as dicts with at least season, h_title and a_title.
+
+        Features come from the final trainset row for the same fixture; any
+        value in the request, such as fresh book_odds_h/d/a, overrides it.
+        Odds may be in any format parse_odds reads ('5/2', 'evens', '+150', 3.5).
+        Fixtures not in the trainset must carry every feature column.
+        """
+        state = self.state
+        threshold = self.threshold if threshold is None else threshold
+
+        request = pd.DataFrame(fixtures)
+        missing_key = [col for col in FIXTURE_KEY if col not in request.columns]
+        if missing_key:
+            raise ValueError(f"Fixtures need {', '.join(missing_key)}")
+        for col in request.columns.intersection(ODDS_COLS):
+            parsed = parse_odds(request[col])
+            invalid = request[col].notna() & parsed.isna()
+            if invalid.any():
+                raise ValueError(f"Invalid {col}: {', '.join(map(str, request.loc[invalid, col]))}")
+            request[col] = parsed
+
+        keys = pd.MultiIndex.from_frame(request[FIXTURE_KEY])
+        df = state.features.reindex(keys).reset_index()
+        for col in request.columns.difference(FIXTURE_KEY):
+            df[col] = request[col].where(request[col].notna(), df[col]) if col in df.columns else request[col]
+        for col in OUTPUT_COLS[:5]:
+            if col not in df.columns:
+                df[col] = None
+
+        incomplete = df[df[state.feature_cols].isna().any(axis=1)]
+        if len(incomplete):
+            names = ', '.join(f"{row.h_title} v {row.a_title} ({row.season})" for row in incomplete.itertuples())
+            raise ValueError(f"No features for: {names}")
+
+        df = score_fixtures(df, state.model, state.le, state.feature_cols, threshold)
+        # float32 model output would otherwise serialise as e.g. 0.7059999704
+        df[['pred_H', 'pred_D', 'pred_A']] = df[['pred_H', 'pred_D', 'pred_A']].astype(float).round(3)
+        return df[RESPONSE_COLS], state
+
+def make_handler(service):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _health(self):
+            state = service.state
+            return {'status': 'ok', 'model_loaded_at': state.loaded_at, 'fixtures': len(state.features)}
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, self._health())
+            else:
+                self._send(404, {'error': f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path == '/reload':
+                try:
+                    reloaded = service.reload(force=True)
+                except Exception as e:
+                    self._send(500, {'error': f"{type(e).__name__}: {e}"})
+                    return
+                self._send(200, {'reloaded': reloaded, **self._health()})
+                return
+            if self.path != '/score':
+                self._send(404, {'error': f"Unknown path {self.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                scored, state = service.score(body['fixtures'], body.get('threshold'))
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                # e.g. an xgboost error, or a reload failing mid-request
+                self._send(500, {'error': f"{type(e).__name__}: {e}"})
+                return
+
+            self._send(200, {
+                'predictions': json.loads(scored.to_json(orient='records', date_format='iso')),
+                'model_loaded_at': state.loaded_at,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoringHandler
+
+def serve(model_path, label_encoder_path, features_path, final_trainset_path, threshold,
+          host='127.0.0.1', port=8765, reload_interval=5.0):
+    """
+    Serves POST /score, POST /reload and GET /health on host:port until interrupted.
+
+    POST /score takes {"fixtures": [{"season": 2025, "h_title": ..., "a_title": ...,
+    "book_odds_h": ..., ...}], "threshold": optional} and returns the
+    predicted probabilities, EVs and bet decision for each fixture.
+    """
+    service = ScoringService(model_path, label_encoder_path, features_path, final_trainset_path, threshold)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    stop = threading.Event()
+    if reload_interval:
+        threading.Thread(target=service.watch, args=(reload_interval, stop), daemon=True).start()
+
+    print(f"Scoring service on http://{host}:{port} (model loaded at {service.state.loaded_at})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return service
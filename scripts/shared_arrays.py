@@ -0,0 +1,22 @@
+import os
+import numpy as np
+
+# Read-only arrays shared by every task in a process pool worker. The parent
+# saves them once as .npy files and each worker memory-maps them in its pool
+# initializer, so workers do not each hold a copy. Used by the backtest and
+# the hyperparameter search.
+shared = {}
+
+def save_shared_arrays(arrays, cache_dir):
+    """Writes each named array to cache_dir as .npy and returns their paths."""
+    paths = {}
+    for name, values in arrays.items():
+        paths[name] = os.path.join(cache_dir, f"{name}.npy")
+        np.save(paths[name], values)
+    return paths
+
+def load_shared_arrays(paths):
+    """Pool initializer: memory-maps the arrays once per worker."""
+    shared.clear()
+    for name, path in paths.items():
+        shared[name] = np.load(path, mmap_mode='r')
@@ -1,16 +1,20 @@
+import glob
 import os
+import numpy as np
 import pandas as pd
 
-def simulate_bets(results_df):
+STAKING_RULES = ['flat', 'proportional', 'kelly']
+OUTCOME_MODELS = ['bookmaker', 'model']
+
+def simulate_bets(results_df, output_dir="data/output/train_eval"):
     # Filter rows where the model made a bet
     bets = results_df[results_df['prediction'].notnull()].copy()
 
     # Map the odds for the decision placed
-    bets['odds'] = bets.apply(
-        lambda row: row['book_odds_h'] if row['prediction'] == 'H'
-        else row['book_odds_d'] if row['prediction'] == 'D'
-        else row['book_odds_a'],
-        axis=1
+    bets['odds'] = np.select(
+        [bets['prediction'] == 'H', bets['prediction'] == 'D'],
+        [bets['book_odds_h'], bets['book_odds_d']],
+        default=bets['book_odds_a']
     )
 
     # Determine win/loss
@@ -29,7 +33,6 @@ def simulate_bets(results_df):
     print(f"ROI: {roi:.2f}%")
 
     # Save the detailed bets as a CSV
-    output_dir = "data/output/train_eval"
     os.makedirs(output_dir, exist_ok=True)
     
     bets.to_csv(os.path.join(output_dir, "last_gw_sim_details.csv"), index=False)
@@ -44,4 +47,127 @@ def simulate_bets(results_df):
     summary_df.to_csv(os.path.join(output_dir, "last_gw_sim_summary.csv"), index=False)
 
 
-    return bets
\ No newline at end of file
+    return bets
+
+def load_predictions(predictions_dir, season, gws=None):
+    """Stacks the per-gameweek prediction files of a season, optionally limited to some gameweeks."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(predictions_dir, f"{season}_gw*.csv"))):
+        gw = int(os.path.splitext(os.path.basename(path))[0].split('_gw')[-1])
+        if gws is None or gw in gws:
+            frames.append(pd.read_csv(path))
+    return pd.concat(frames, ignore_index=True).sort_values(by=['season', 'gw', 'datetime'], kind='stable')
+
+def simulate_bankroll(predictions, n_paths=10000, staking='flat', stake=1.0, fraction=0.02, kelly_fraction=0.25,
+                      initial_bankroll=100.0, threshold=0.0, ruin_fraction=0.1, outcome_probs=None,
+                      outcome_model='bookmaker', seed=42):
+    """
+    Monte Carlo bankroll paths for betting the best-EV outcome of each match.
+
+    predictions needs season, gw, pred_H/D/A and book_odds_h/d/a. A match is
+    bet when its best EV beats threshold. Outcomes are sampled, as one
+    (n_paths x matches) array per gameweek, from outcome_probs (n_matches x 3,
+    H/D/A, in the row order of predictions) if given, else by outcome_model:
+    - bookmaker: the odds' implied probabilities with the margin removed
+    - model: the model's own probabilities, which makes every bet +EV by
+      construction, so only useful as an upper bound
+    All bets of a gameweek
+    are staked from the bankroll at its start and scaled down if they would
+    exceed it.
+
+    Staking rules:
+    - flat: `stake` per bet
+    - proportional: `fraction` of the current bankroll per bet
+    - kelly: `kelly_fraction` of the full Kelly stake for the picked outcome
+
+    Returns (paths, summary): bankroll after each gameweek per path
+    (n_paths x n_gameweeks + 1) and a one-row summary DataFrame.
+    """
+    if staking not in STAKING_RULES:
+        raise ValueError(f"staking must be one of {STAKING_RULES}, got {staking}")
+    if outcome_model not in OUTCOME_MODELS:
+        raise ValueError(f"outcome_model must be one of {OUTCOME_MODELS}, got {outcome_model}")
+
+    # outcome_probs follows the rows through the sort
+    predictions = predictions.reset_index(drop=True)
+    order = predictions.sort_values(by=['season', 'gw'], kind='stable').index.to_numpy()
+    predictions = predictions.loc[order]
+    probs = predictions[['pred_H', 'pred_D', 'pred_A']].to_numpy(dtype=float)
+    odds = predictions[['book_odds_h', 'book_odds_d', 'book_odds_a']].to_numpy(dtype=float)
+    if outcome_probs is not None:
+        sample_probs = np.asarray(outcome_probs, dtype=float)[order]
+    elif outcome_model == 'bookmaker':
+        sample_probs = 1 / odds
+    else:
+        sample_probs = probs
+    cum_probs = np.cumsum(sample_probs / sample_probs.sum(axis=1, keepdims=True), axis=1)[:, :2]
+
+    rows = np.arange(len(predictions))
+    ev = probs * odds - 1
+    pick = ev.argmax(axis=1)
+    is_bet = ev[rows, pick] > threshold
+    pick_odds = odds[rows, pick]
+    pick_prob = probs[rows, pick]
+    # Odds of 1.0 or less pay nothing, so Kelly stakes nothing
+    kelly = np.divide(pick_prob * pick_odds - 1, pick_odds - 1, out=np.zeros(len(rows)), where=pick_odds > 1)
+    kelly = np.clip(kelly, 0, None) * kelly_fraction
+
+    gameweeks = predictions.groupby(['season', 'gw'], sort=False).indices
+    rng = np.random.default_rng(seed)
+    paths = np.empty((n_paths, len(gameweeks) + 1))
+    paths[:, 0] = initial_bankroll
+    bankroll = paths[:, 0].copy()
+
+    for i, gw_rows in enumerate(gameweeks.values()):
+        gw_rows = gw_rows[is_bet[gw_rows]]
+        if len(gw_rows):
+            if staking == 'flat':
+                stakes = np.full((n_paths, len(gw_rows)), stake)
+            elif staking == 'proportional':
+                stakes = bankroll[:, None] * fraction * np.ones(len(gw_rows))
+            else:
+                stakes = bankroll[:, None] * kelly[gw_rows]
+
+            total = stakes.sum(axis=1)
+            over = total > bankroll
+            stakes[over] *= (np.maximum(bankroll[over], 0) / total[over])[:, None]
+
+            u = rng.random((n_paths, len(gw_rows)))
+            outcome = (u[:, :, None] > cum_probs[gw_rows]).sum(axis=2)
+            won = outcome == pick[gw_rows]
+            bankroll = bankroll + np.where(won, stakes * (pick_odds[gw_rows] - 1), -stakes).sum(axis=1)
+        paths[:, i + 1] = bankroll
+
+    peaks = np.maximum.accumulate(paths, axis=1)
+    max_drawdown = (1 - paths / peaks).max(axis=1)
+    final = paths[:, -1]
+
+    summary = pd.DataFrame([{
+        "staking": staking,
+        "n_paths": n_paths,
+        "gameweeks": len(gameweeks),
+        "bets_per_path": int(is_bet.sum()),
+        "mean_final": round(final.mean(), 2),
+        "p5_final": round(np.percentile(final, 5), 2),
+        "median_final": round(np.median(final), 2),
+        "p95_final": round(np.percentile(final, 95), 2),
+        "prob_profit": round((final > initial_bankroll).mean(), 4),
+        "ruin_probability": round((paths.min(axis=1) <= initial_bankroll * ruin_fraction).mean(), 4),
+        "median_max_drawdown": round(np.median(max_drawdown), 4),
+        "p95_max_drawdown": round(np.percentile(max_drawdown, 95), 4),
+    }])
+    return paths, summary
+
+def run_bankroll_simulation(predictions, output_dir="data/output/train_eval", **kwargs):
+    """Simulates every staking rule on the same predictions and saves the summaries."""
+    summaries = []
+    for staking in STAKING_RULES:
+        _, summary = simulate_bankroll(predictions, staking=staking, **kwargs)
+        summaries.append(summary)
+
+    summary_df = pd.concat(summaries, ignore_index=True)
+    print(summary_df.to_string(index=False))
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary_df.to_csv(os.path.join(output_dir, "bankroll_sim_summary.csv"), index=False)
+    return summary_df
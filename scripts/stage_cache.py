@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+
+def file_digest(path):
+    """sha256 of a file's contents, None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_fingerprint(input_files=(), config_values=None, code_files=(), extra=None):
+    """Hashes everything a stage reads: input files, config keys and the source of its modules."""
+    payload = {
+        'files': {path: file_digest(path) for path in input_files},
+        'config': config_values or {},
+        'code': {path: file_digest(path) for path in code_files},
+        'extra': extra,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def manifest_path(stage, outputs):
+    """The stage's hash file, stored next to its first output."""
+    return os.path.join(os.path.dirname(outputs[0]) or '.', f'.{stage}.stage.json')
+
+def stage_is_fresh(stage, fingerprint, outputs):
+    """True when the stage last ran on the same inputs and its outputs are untouched since."""
+    path = manifest_path(stage, outputs)
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('fingerprint') != fingerprint:
+        return False
+    recorded = manifest.get('outputs', {})
+    return all(
+        output in recorded and file_digest(output) == recorded[output]
+        for output in outputs
+    )
+
+def record_stage(stage, fingerprint, outputs):
+    manifest = {
+        'stage': stage,
+        'fingerprint': fingerprint,
+        'outputs': {output: file_digest(output) for output in outputs},
+    }
+    with open(manifest_path(stage, outputs), 'w') as f:
+        json.dump(manifest, f, indent=2)
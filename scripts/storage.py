@@ -0,0 +1,177 @@
+import os
+import pandas as pd
+
+# File extension per storage format; parquet and arrow need pyarrow installed
+STORAGE_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+# Explicit column types for the tables handed between stages. Columns not
+# listed keep whatever type they already have.
+SCHEMAS = {
+    'matches': {
+        'id': 'int64',
+        'isResult': 'bool',
+        'datetime': 'datetime64[ns]',
+        'season': 'int64',
+        'h_id': 'int64',
+        'h_title': 'object',
+        'h_short_title': 'object',
+        'a_id': 'int64',
+        'a_title': 'object',
+        'a_short_title': 'object',
+        'goals_h': 'int64',
+        'goals_a': 'int64',
+        'xG_h': 'float64',
+        'xG_a': 'float64',
+        'forecast_w': 'float64',
+        'forecast_d': 'float64',
+        'forecast_l': 'float64',
+    },
+    'elo': {
+        'title': 'object',
+        'Rank': 'float64',
+        'Club': 'object',
+        'Country': 'object',
+        'Level': 'int64',
+        'Elo': 'float64',
+        'From': 'datetime64[ns]',
+        'To': 'datetime64[ns]',
+    },
+    'team_matches': {
+        'id': 'int64',
+        'title': 'object',
+        'season': 'int64',
+        'date': 'datetime64[ns]',
+        'h_a': 'object',
+        'scored': 'int64',
+        'missed': 'int64',
+        'xG': 'float64',
+        'xGA': 'float64',
+        'pts': 'int64',
+        'xpts': 'float64',
+    },
+    'trainset': {
+        'gw': 'int64',
+        'datetime': 'datetime64[ns]',
+        'season': 'int64',
+        'h_id': 'int64',
+        'h_title': 'object',
+        'a_id': 'int64',
+        'a_title': 'object',
+        'goals_h': 'float64',
+        'goals_a': 'float64',
+        'xG_h': 'float64',
+        'xG_a': 'float64',
+        'outcome': 'object',
+        'book_odds_h': 'float64',
+        'book_odds_d': 'float64',
+        'book_odds_a': 'float64',
+        # Counts from feature engineering, kept integer through a store round trip
+        'h2h_home_wins': 'int64',
+        'h2h_away_wins': 'int64',
+        'h2h_draws': 'int64',
+        'h2h_matches_played': 'int64',
+        'h_form_points': 'int64',
+        'a_form_points': 'int64',
+    },
+    'predictions': {
+        'datetime': 'datetime64[ns]',
+        'season': 'int64',
+        'gw': 'int64',
+        'h_title': 'object',
+        'a_title': 'object',
+        'book_odds_h': 'float64',
+        'book_odds_d': 'float64',
+        'book_odds_a': 'float64',
+        'pred_H': 'float64',
+        'pred_D': 'float64',
+        'pred_A': 'float64',
+        'bet_decision': 'object',
+        'predicted_outcome': 'object',
+    },
+}
+
+def storage_format_of(path):
+    ext = os.path.splitext(path)[1]
+    for storage_format, format_ext in STORAGE_FORMATS.items():
+        if ext == format_ext:
+            return storage_format
+    raise ValueError(f"Unknown storage format for {path}")
+
+def stage_path(path, storage_format='csv'):
+    """Swaps the extension of a configured path for the chosen storage format."""
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"storage_format must be one of {list(STORAGE_FORMATS)}, got {storage_format}")
+    return os.path.splitext(path)[0] + STORAGE_FORMATS[storage_format]
+
+def apply_schema(df, schema):
+    """Casts the schema's columns that are present in df."""
+    if not schema:
+        return df
+    df = df.copy()
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col])
+        elif dtype == 'int64' and df[col].isna().any():
+            df[col] = pd.to_numeric(df[col]).astype('Int64')
+        elif dtype in ('int64', 'float64'):
+            df[col] = pd.to_numeric(df[col]).astype(dtype)
+        elif dtype == 'bool' and df[col].dtype == object:
+            df[col] = df[col].map({'True': True, 'False': False, True: True, False: False})
+        elif dtype == 'object':
+            # Text columns hold strings or nulls, never a stray number (e.g. a
+            # fixture's outcome filled with 0), which Arrow cannot store
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow storage needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+def write_table(df, path, schema=None):
+    """Writes df in the format given by the extension of path."""
+    storage_format = storage_format_of(path)
+    if storage_format == 'csv':
+        df.to_csv(path, index=False)
+        return
+
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(apply_schema(df, schema), preserve_index=False)
+    if storage_format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_table(path, schema=None, columns=None):
+    """
+    Reads a table written by write_table, memory-mapping Parquet/Arrow files.
+    The schema is applied whatever the format, so every format returns the
+    same dtypes.
+    """
+    storage_format = storage_format_of(path)
+    if storage_format == 'csv':
+        return apply_schema(pd.read_csv(path, usecols=columns, float_precision='round_trip'), schema)
+
+    pa = _pyarrow()
+    if storage_format == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            return apply_schema(table.to_pandas(), schema)
+    return apply_schema(table.to_pandas(), schema)
@@ -0,0 +1,104 @@
+import itertools
+import os
+import numpy as np
+import pandas as pd
+
+OUTCOMES = ['H', 'D', 'A']
+STAKING_RULES = ['flat', 'kelly']
+
+def strategy_grid(thresholds=None, outcome_filters=None, odds_bands=None, staking_rules=None):
+    """Every combination of EV threshold, outcome filter, odds band and staking rule."""
+    thresholds = thresholds if thresholds is not None else np.round(np.arange(0.0, 0.51, 0.01), 2)
+    outcome_filters = outcome_filters or ['HDA', 'H', 'D', 'A', 'HA']
+    odds_bands = odds_bands or [(1.0, 100.0), (1.0, 2.0), (2.0, 4.0), (4.0, 100.0), (1.5, 3.0)]
+    staking_rules = staking_rules or STAKING_RULES
+
+    grid = pd.DataFrame(
+        list(itertools.product(thresholds, outcome_filters, odds_bands, staking_rules)),
+        columns=['threshold', 'outcomes', 'odds_band', 'staking']
+    )
+    grid['min_odds'] = grid['odds_band'].str[0]
+    grid['max_odds'] = grid['odds_band'].str[1]
+    return grid.drop(columns=['odds_band'])
+
+def sweep_strategies(predictions, grid, kelly_fraction=0.25, chunk_size=512):
+    """
+    Scores every strategy in grid against every match in one batched array computation.
+
+    predictions needs season, pred_H/D/A, book_odds_h/d/a and outcome. For each
+    strategy a match is bet on the highest-EV outcome that passes its filter,
+    its odds band [min_odds, max_odds) and its EV threshold, as in predict_gw's
+    decide_bet. Strategies are processed chunk_size at a time as
+    (strategies x matches x outcomes) arrays to bound memory.
+
+    Returns one row per strategy and season, plus an 'all' season row, with
+    bet volume, hit rate, profit and ROI on stakes.
+    """
+    predictions = predictions[predictions['outcome'].isin(OUTCOMES)].sort_values(by='season', kind='stable')
+    probs = predictions[['pred_H', 'pred_D', 'pred_A']].to_numpy(dtype=float)
+    odds = predictions[['book_odds_h', 'book_odds_d', 'book_odds_a']].to_numpy(dtype=float)
+    won = predictions['outcome'].to_numpy()[:, None] == np.array(OUTCOMES)
+    ev = probs * odds - 1
+    # Odds of 1.0 or less (0 where a price is missing) pay nothing, so Kelly stakes nothing
+    kelly = np.divide(ev, odds - 1, out=np.zeros_like(ev), where=odds > 1)
+    kelly = np.clip(kelly, 0, None) * kelly_fraction
+
+    seasons, season_starts = np.unique(predictions['season'].to_numpy(), return_index=True)
+    thresholds = grid['threshold'].to_numpy(dtype=float)
+    allowed = np.array([[outcome in allowed for outcome in OUTCOMES] for allowed in grid['outcomes']])
+    min_odds = grid['min_odds'].to_numpy(dtype=float)
+    max_odds = grid['max_odds'].to_numpy(dtype=float)
+    is_kelly = (grid['staking'] == 'kelly').to_numpy()
+
+    totals = {name: np.empty((len(grid), len(seasons))) for name in ['n_bets', 'hits', 'staked', 'profit']}
+    for start in range(0, len(grid), chunk_size):
+        s = slice(start, start + chunk_size)
+        eligible = (
+            (ev[None] > thresholds[s, None, None])
+            & allowed[s, None, :]
+            & (odds[None] >= min_odds[s, None, None])
+            & (odds[None] < max_odds[s, None, None])
+        )
+        pick = np.where(eligible, ev[None], -np.inf).argmax(axis=2)
+        is_bet = eligible.any(axis=2)
+
+        pick_won = np.take_along_axis(won[None], pick[..., None], axis=2)[..., 0] & is_bet
+        pick_odds = np.take_along_axis(odds[None], pick[..., None], axis=2)[..., 0]
+        pick_kelly = np.take_along_axis(kelly[None], pick[..., None], axis=2)[..., 0]
+        stakes = np.where(is_kelly[s, None], pick_kelly, 1.0) * is_bet
+        profit = np.where(pick_won, stakes * (pick_odds - 1), -stakes)
+
+        totals['n_bets'][s] = np.add.reduceat(is_bet, season_starts, axis=1)
+        totals['hits'][s] = np.add.reduceat(pick_won, season_starts, axis=1)
+        totals['staked'][s] = np.add.reduceat(stakes, season_starts, axis=1)
+        totals['profit'][s] = np.add.reduceat(profit, season_starts, axis=1)
+
+    # Append an all-seasons column
+    seasons = [*seasons.tolist(), 'all']
+    totals = {name: np.column_stack([values, values.sum(axis=1)]) for name, values in totals.items()}
+
+    results = grid.loc[grid.index.repeat(len(seasons))].reset_index(drop=True)
+    results['season'] = np.tile(np.array(seasons, dtype=object), len(grid))
+    for name, values in totals.items():
+        results[name] = values.ravel()
+    results['n_bets'] = results['n_bets'].astype(int)
+    results['hits'] = results['hits'].astype(int)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['hit_rate'] = (results['hits'] / results['n_bets']).round(4)
+        results['roi_percent'] = (results['profit'] / results['staked'] * 100).round(2)
+    results['staked'] = results['staked'].round(2)
+    results['profit'] = results['profit'].round(2)
+    return results
+
+def run_strategy_sweep(predictions, output_path, min_bets=50, kelly_fraction=0.25, **grid_kwargs):
+    grid = strategy_grid(**grid_kwargs)
+    results = sweep_strategies(predictions, grid, kelly_fraction=kelly_fraction)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    results.to_csv(output_path, index=False)
+
+    overall = results[(results['season'] == 'all') & (results['n_bets'] >= min_bets)]
+    print(f"Evaluated {len(grid)} strategies over {results['season'].nunique() - 1} seasons")
+    print(overall.sort_values(by='roi_percent', ascending=False).head(10).to_string(index=False))
+    print(f"Strategy sweep saved to {output_path}")
+    return results
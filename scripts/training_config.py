@@ -0,0 +1,35 @@
+import json
+import os
+
+# Versioned training configs written by scripts.tune and read by the train stage.
+# Kept apart from tune.py so the pipeline can find the latest without importing xgboost.
+
+def next_config_version(config_dir):
+    versions = [
+        int(name[1:-5]) for name in os.listdir(config_dir)
+        if name.startswith('v') and name.endswith('.json') and name[1:-5].isdigit()
+    ] if os.path.isdir(config_dir) else []
+    return max(versions, default=0) + 1
+
+def save_training_config(config_dir, params, metadata):
+    """Writes the next versioned training config, v001.json, v002.json, ..., and returns its path."""
+    os.makedirs(config_dir, exist_ok=True)
+    version = next_config_version(config_dir)
+    path = os.path.join(config_dir, f"v{version:03d}.json")
+    with open(path, 'w') as f:
+        json.dump({'version': version, 'params': params, **metadata}, f, indent=2, default=str)
+    return path
+
+def latest_training_config_path(config_dir):
+    if not config_dir or not os.path.isdir(config_dir):
+        return None
+    version = next_config_version(config_dir) - 1
+    return os.path.join(config_dir, f"v{version:03d}.json") if version else None
+
+def load_training_config(config_dir):
+    """The latest versioned training config in config_dir, or None when there is none."""
+    path = latest_training_config_path(config_dir)
+    if path is None:
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
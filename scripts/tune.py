@@ -0,0 +1,150 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scripts.backtest import LABELS
+from scripts.baseline_model import TARGET_COL, get_feature_cols
+from scripts.shared_arrays import load_shared_arrays, save_shared_arrays, shared
+from scripts.training_config import save_training_config
+
+# Sampled per trial: ('log', low, high), ('uniform', low, high) or ('int', low, high)
+SEARCH_SPACE = {
+    'max_depth': ('int', 2, 8),
+    'learning_rate': ('log', 0.01, 0.3),
+    'min_child_weight': ('log', 1, 20),
+    'subsample': ('uniform', 0.5, 1.0),
+    'colsample_bytree': ('uniform', 0.4, 1.0),
+    'reg_lambda': ('log', 0.1, 20),
+    'gamma': ('uniform', 0.0, 2.0),
+}
+
+def sample_params(n_trials, space=SEARCH_SPACE, seed=42):
+    """n_trials random configurations; the first is XGBoost's defaults, as a baseline."""
+    rng = np.random.default_rng(seed)
+    trials = [{}]
+    for _ in range(n_trials - 1):
+        params = {}
+        for name, (kind, low, high) in space.items():
+            if kind == 'int':
+                params[name] = int(rng.integers(low, high + 1))
+            elif kind == 'log':
+                params[name] = round(float(np.exp(rng.uniform(np.log(low), np.log(high)))), 4)
+            else:
+                params[name] = round(float(rng.uniform(low, high)), 4)
+        trials.append(params)
+    return trials
+
+def expanding_window_folds(trainset, n_seasons=3, early_stopping_gws=5, open_seasons=()):
+    """
+    Yields (season, fit_rows, stop_rows, valid_rows) over a date-sorted trainset.
+
+    Each of the last n_seasons complete seasons is a validation fold; seasons
+    in open_seasons still have fixtures to play and are skipped. A fold's
+    model trains on every earlier match, minus the last early_stopping_gws
+    gameweeks before the season, which early stopping watches instead.
+    """
+    seasons = [season for season in sorted(trainset['season'].unique()) if season not in set(open_seasons)]
+    for season in seasons[-n_seasons:]:
+        before = trainset.index[trainset['season'] < season].to_numpy()
+        gws = trainset.loc[before, ['season', 'gw']].drop_duplicates()
+        stop_gws = gws.iloc[-early_stopping_gws:]
+        is_stop = trainset.loc[before].set_index(['season', 'gw']).index.isin(pd.MultiIndex.from_frame(stop_gws))
+        yield int(season), before[~is_stop], before[is_stop], trainset.index[trainset['season'] == season].to_numpy()
+
+def _run_trial(trial):
+    trial_id, params, folds, n_jobs, num_boost_round, early_stopping_rounds = trial
+    X, y = shared['X'], shared['y']
+    booster_params = {
+        'objective': 'multi:softprob',
+        'num_class': len(LABELS),
+        'eval_metric': 'mlogloss',
+        'seed': 42,
+        'nthread': n_jobs,
+        **params,
+    }
+
+    scores, best_rounds = [], []
+    for season, fit_rows, stop_rows, valid_rows in folds:
+        dfit = xgb.DMatrix(X[fit_rows], y[fit_rows], nthread=n_jobs)
+        dstop = xgb.DMatrix(X[stop_rows], y[stop_rows], nthread=n_jobs)
+        booster = xgb.train(
+            booster_params, dfit, num_boost_round=num_boost_round,
+            evals=[(dstop, 'stop')], early_stopping_rounds=early_stopping_rounds, verbose_eval=False
+        )
+        dvalid = xgb.DMatrix(X[valid_rows], y[valid_rows], nthread=n_jobs)
+        proba = booster.predict(dvalid, iteration_range=(0, booster.best_iteration + 1))
+        rows = np.arange(len(valid_rows))
+        scores.append(float(-np.log(np.clip(proba[rows, y[valid_rows]], 1e-15, 1)).mean()))
+        best_rounds.append(booster.best_iteration + 1)
+
+    return {
+        'trial': trial_id,
+        **params,
+        'cv_log_loss': round(float(np.mean(scores)), 5),
+        'cv_log_loss_std': round(float(np.std(scores)), 5),
+        'n_estimators': int(np.median(best_rounds)),
+        **{f'log_loss_{season}': round(score, 5) for (season, _, _, _), score in zip(folds, scores)},
+    }
+
+def run_tuning(final_trainset, config_dir, trials_output_path, n_trials=40, n_seasons=3, early_stopping_gws=5,
+               num_boost_round=1000, early_stopping_rounds=30, max_workers=None, threads_per_trial=1, seed=42):
+    """
+    Random hyperparameter search scored by expanding-window season folds.
+
+    Trials are spread over a process pool, each fitting with threads_per_trial
+    XGBoost threads; by default there are as many workers as fit on the cores
+    at that thread count. As in the backtest, the feature matrix is written
+    once as .npy files and memory-mapped by every worker.
+
+    The best trial is written as the next versioned training config in
+    config_dir, which the weekly train_model run picks up.
+    """
+    played = final_trainset[TARGET_COL].isin(LABELS)
+    open_seasons = set(final_trainset.loc[~played, 'season'])
+    df = final_trainset[played].copy()
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df = df.sort_values(by=['datetime', 'season', 'gw'], kind='stable').reset_index(drop=True)
+
+    feature_cols = get_feature_cols(df)
+    arrays = {
+        'X': df[feature_cols].to_numpy(dtype=np.float32),
+        'y': df[TARGET_COL].map({label: i for i, label in enumerate(LABELS)}).to_numpy(dtype=np.int64),
+    }
+    folds = list(expanding_window_folds(df, n_seasons, early_stopping_gws, open_seasons))
+    trials = [
+        (i, params, folds, threads_per_trial, num_boost_round, early_stopping_rounds)
+        for i, params in enumerate(sample_params(n_trials, seed=seed))
+    ]
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) // threads_per_trial)
+    print(f"Tuning {len(trials)} trials x {len(folds)} folds on {max_workers} workers x {threads_per_trial} threads")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        paths = save_shared_arrays(arrays, cache_dir)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=load_shared_arrays, initargs=(paths,)) as pool:
+            results = pd.DataFrame(list(pool.map(_run_trial, trials)))
+
+    results = results.sort_values(by='cv_log_loss', kind='stable').reset_index(drop=True)
+    os.makedirs(os.path.dirname(trials_output_path) or '.', exist_ok=True)
+    results.to_csv(trials_output_path, index=False)
+
+    best = results.iloc[0]
+    baseline = results.loc[results['trial'] == 0, 'cv_log_loss'].iloc[0]
+    params = {name: best[name] for name in SEARCH_SPACE if name in best and pd.notna(best[name])}
+    params = {name: int(value) if SEARCH_SPACE[name][0] == 'int' else float(value) for name, value in params.items()}
+    params['n_estimators'] = int(best['n_estimators'])
+
+    config_path = save_training_config(config_dir, params, {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'cv_log_loss': float(best['cv_log_loss']),
+        'baseline_cv_log_loss': float(baseline),
+        'cv_seasons': [season for season, _, _, _ in folds],
+        'n_trials': len(trials),
+        'n_matches': len(df),
+        'feature_cols': feature_cols,
+    })
+    print(results.head(5).to_string(index=False))
+    print(f"Best CV log loss {best['cv_log_loss']:.4f} (defaults {baseline:.4f}); training config saved to {config_path}")
+    return results, config_path
@@ -0,0 +1,42 @@
+import os
+import pandas as pd
+import run_pipeline
+from scripts.prediction_history import record_predictions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def small_predictions():
+    rows = []
+    for gw in [1, 2]:
+        for i, (h_title, a_title) in enumerate([('Arsenal', 'Chelsea'), ('Everton', 'Fulham'), ('Leeds', 'Wolves')]):
+            rows.append({
+                'datetime': f"2025-08-{10 + 7 * gw:02d}", 'season': 2025, 'gw': gw,
+                'h_title': h_title, 'a_title': a_title,
+                'book_odds_h': 2.1 + i * 0.3, 'book_odds_d': 3.4, 'book_odds_a': 3.8 - i * 0.4,
+                'pred_H': 0.5, 'pred_D': 0.25, 'pred_A': 0.25,
+                'bet_decision': 'H', 'predicted_outcome': 'H',
+            })
+    return pd.DataFrame(rows)
+
+def test_bankroll_stage_end_to_end(tmp_path):
+    store_dir = str(tmp_path / 'history')
+    record_predictions(store_dir, small_predictions())
+
+    config = run_pipeline.load_config(os.path.join(ROOT, 'config.yaml'))
+    config.update({
+        'history_store_dir': store_dir,
+        'sim_output_dir': str(tmp_path / 'train_eval'),
+        'run_log_dir': str(tmp_path / 'run_logs'),
+        'output_predictions_path': str(tmp_path / 'predictions' / '{season_to_predict}_gw{gw_to_predict}.csv'),
+        'season_to_predict': 2025,
+        'threshold_ev': 0.0,
+        'bankroll_paths': 200,
+    })
+    state = run_pipeline.main(force=['bankroll'], stages=['bankroll'], config=config)
+
+    summary = pd.read_csv(tmp_path / 'train_eval' / 'bankroll_sim_summary.csv')
+    assert summary['staking'].tolist() == ['flat', 'proportional', 'kelly']
+    assert (summary['gameweeks'] == 2).all()
+    assert (summary['bets_per_path'] == 6).all()
+    assert summary['prob_profit'].between(0, 1).all()
+    assert state['bankroll'].equals(summary)